@@ -3,10 +3,10 @@ import os
 from dotenv import load_dotenv
 from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, contextmanager
 import openai
 from logging_setup import setup_app_logger
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pathlib import Path
 
 from langgraph.graph import StateGraph, START
@@ -17,34 +17,54 @@ from langgraph.prebuilt import ToolNode, tools_condition, InjectedState
 from langchain_core.tools import tool
 
 from typing import Dict, Optional, List
-from fastapi import UploadFile, File, Query, BackgroundTasks
+from fastapi import UploadFile, File, Query
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
+import aiofiles
 from sqlalchemy import (
-    create_engine, Column, String, Integer, DateTime, Boolean, ForeignKey, JSON, DECIMAL, and_
+    create_engine, Column, String, Integer, DateTime, Boolean, ForeignKey, JSON, DECIMAL, and_, or_,
+    UniqueConstraint, Index, select,
 )
-from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import declarative_base, sessionmaker, Session, aliased
 from sqlalchemy.sql import func
+from sqlalchemy import text
 from datetime import datetime, timedelta
 from sqlalchemy import DateTime
 import pandas as pd
+import numpy as np
 import uuid
 
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 import base64, os, hashlib
+import hmac
+import random
+import shutil
 import json
+import xxhash
 
-from threading import Thread
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import multiprocessing
+from functools import partial
 from email_client import (
-    send_storeowner_dispatch_email,
-    send_supplier_failure_email,
+    EMAIL_CLIENT,
+    RETRY_STATUS_CODES,
+    send_template_email,
 )
+import threading
+import time
 
 from auth_middleware import jwt_auth_middleware
-
-from prophet import Prophet
-import requests
-
-from statistics import mean
+from upload_limit import UploadSizeLimitMiddleware
+from upload_progress import UploadProgressChannel
+from upload_scheduler import KeyedJobScheduler
+from upload_rejects import RejectedRowsReport
+from forecast_cache import WatermarkCache
+from forecast_jobs import ForecastJobQueue, JobQueueFullError
+from forecasting import forecast_medicine, InsufficientHistoryError
+from sse_starlette.sse import EventSourceResponse
+import asyncio
 
 import re
 
@@ -61,8 +81,80 @@ SECRET_KEY = base64.b64decode(os.getenv("CRYPTO_KEY"))
 BASE_DIR = Path(__file__).resolve().parent
 SUPPLIER_TEMPLATE_PATH = BASE_DIR / "templates" / "supplier_upload_template.xlsx"
 
-UPLOAD_STORE = Path("/tmp/zenith_uploads")
-UPLOAD_STORE.mkdir(parents=True, exist_ok=True)
+# Source files, parsed frames and rejected-rows reports; owned by the app user and shared by every worker
+UPLOAD_STORE = Path(os.getenv("UPLOAD_STORE_DIR", str(BASE_DIR / "uploads")))
+UPLOAD_STORE.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+# Rows committed per transaction; the last committed row offset is checkpointed with each chunk
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", "500"))
+# A PROCESSING upload without a checkpoint for this long is treated as interrupted
+UPLOAD_STALE_SECONDS = int(os.getenv("UPLOAD_STALE_SECONDS", "120"))
+# Identical files for the same store within this window are not processed again (0 disables)
+UPLOAD_DEDUP_WINDOW_HOURS = int(os.getenv("UPLOAD_DEDUP_WINDOW_HOURS", "24"))
+# Largest accepted supplier file; bodies are streamed to disk in UPLOAD_READ_CHUNK_BYTES pieces
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_READ_CHUNK_BYTES = 1024 * 1024
+# Multipart bodies are cut off while received once larger than the file limit plus this much form overhead
+UPLOAD_FORM_OVERHEAD_BYTES = 64 * 1024
+# Row-level errors returned by a preview; the summary always covers every row
+UPLOAD_PREVIEW_MAX_ERRORS = int(os.getenv("UPLOAD_PREVIEW_MAX_ERRORS", "200"))
+# Live progress is published at most this often per upload; the database only sees phase changes
+UPLOAD_PROGRESS_INTERVAL_SECONDS = float(os.getenv("UPLOAD_PROGRESS_INTERVAL_SECONDS", "1"))
+
+# Progress streams re-read the Upload row after this long without a live event
+UPLOAD_EVENTS_FALLBACK_SECONDS = float(os.getenv("UPLOAD_EVENTS_FALLBACK_SECONDS", "5"))
+
+# Upload jobs for different stores run in parallel up to this limit; one store runs one job at a time
+UPLOAD_MAX_CONCURRENCY = int(os.getenv("UPLOAD_MAX_CONCURRENCY", str(os.cpu_count() or 4)))
+# A job whose store is locked by another worker process is queued again after this delay
+UPLOAD_LOCK_RETRY_SECONDS = float(os.getenv("UPLOAD_LOCK_RETRY_SECONDS", "5"))
+
+# Notification emails go through the EmailOutbox table; the dispatcher claims due rows in batches
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "50"))
+EMAIL_OUTBOX_POLL_SECONDS = float(os.getenv("EMAIL_OUTBOX_POLL_SECONDS", "5"))
+# After this many failed sends an email is dead-lettered (status DEAD)
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "8"))
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_OUTBOX_RETRY_BASE_SECONDS", "30"))
+EMAIL_OUTBOX_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_OUTBOX_RETRY_MAX_SECONDS", "3600"))
+# Upload dispatch emails to the same recipient within this window go out as one digest (0 disables)
+EMAIL_DIGEST_WINDOW_SECONDS = int(os.getenv("EMAIL_DIGEST_WINDOW_SECONDS", "300"))
+# Resolved notification recipients (names and addresses) are reused for this long per store and supplier
+NOTIFICATION_RECIPIENT_TTL_SECONDS = float(os.getenv("NOTIFICATION_RECIPIENT_TTL_SECONDS", "300"))
+# A SENDING row older than this belongs to a dispatcher that died and is claimed again
+EMAIL_OUTBOX_SENDING_TIMEOUT_SECONDS = int(os.getenv("EMAIL_OUTBOX_SENDING_TIMEOUT_SECONDS", "300"))
+
+# Forecast responses kept per (store, medicine, horizons), valid until the sales or batch data changes
+FORECAST_CACHE_MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "2048"))
+# Worker processes fitting forecast models for batch requests
+FORECAST_MAX_WORKERS = int(os.getenv("FORECAST_MAX_WORKERS", str(os.cpu_count() or 4)))
+# Fits one batch request keeps on the forecast pool at once; the rest of the batch waits its turn
+FORECAST_BATCH_MAX_IN_FLIGHT = int(os.getenv("FORECAST_BATCH_MAX_IN_FLIGHT", str(max(1, FORECAST_MAX_WORKERS // 2))))
+# Forecast jobs queued or running at once before submissions get 429, and how long finished jobs stay pollable
+FORECAST_JOB_MAX_PENDING = int(os.getenv("FORECAST_JOB_MAX_PENDING", "100"))
+FORECAST_JOB_TTL_SECONDS = float(os.getenv("FORECAST_JOB_TTL_SECONDS", "900"))
+# Nightly precompute of every store's forecasts into MedicineForecast: UTC hour it starts (negative disables)
+FORECAST_PRECOMPUTE_HOUR = int(os.getenv("FORECAST_PRECOMPUTE_HOUR", "2"))
+# Worker processes of the precompute; a pool of its own, started per run, so it never queues ahead of request fits
+FORECAST_PRECOMPUTE_WORKERS = int(os.getenv("FORECAST_PRECOMPUTE_WORKERS", str(max(1, (os.cpu_count() or 4) // 4))))
+# Horizons (days) stored by the precompute; precomputed reads can ask for any subset
+FORECAST_PRECOMPUTE_HORIZONS = [int(h) for h in os.getenv("FORECAST_PRECOMPUTE_HORIZONS", "7,15,30").split(",")]
+
+UPLOAD_PROGRESS = UploadProgressChannel(min_interval=UPLOAD_PROGRESS_INTERVAL_SECONDS)
+UPLOAD_SCHEDULER = KeyedJobScheduler(max_workers=UPLOAD_MAX_CONCURRENCY, thread_name_prefix="upload")
+FORECAST_CACHE = WatermarkCache(max_entries=FORECAST_CACHE_MAX_ENTRIES)
+# spawn, not fork: the parent runs threads (scheduler, email dispatcher) that must not be cloned
+FORECAST_POOL = ProcessPoolExecutor(
+    max_workers=FORECAST_MAX_WORKERS,
+    mp_context=multiprocessing.get_context("spawn"),
+)
+# Job state lives in this process only: serve the app from a single worker
+# process (as __main__ does), or polling a job can reach a worker that never
+# saw it and get a 404
+FORECAST_JOBS = ForecastJobQueue(
+    FORECAST_POOL,
+    max_pending=FORECAST_JOB_MAX_PENDING,
+    ttl_seconds=FORECAST_JOB_TTL_SECONDS,
+)
 
 if not all ([DB_URI, BASE_URL, API_KEY, MODEL_NAME]):
     raise ValueError("One or more required environment variables are missing.")
@@ -102,6 +194,11 @@ class Supplier(Base):
     createdAt = Column(DateTime, server_default=func.now())
 
 
+def normalized_code(column):
+    """SKU/NDC as uploads match it: trimmed and lower-cased (indexed in this form)."""
+    return func.lower(func.trim(column))
+
+
 class Medicine(Base):
     __tablename__ = "Medicine"
     id = Column(String, primary_key=True)
@@ -119,6 +216,11 @@ class Medicine(Base):
     updatedAt = Column(DateTime, server_default=func.now(),
                        onupdate=func.now(), nullable=False)
 
+    __table_args__ = (
+        Index("Medicine_storeId_sku_key", storeId, normalized_code(sku), unique=True),
+        Index("Medicine_storeId_ndc_normalized_idx", storeId, normalized_code(ndc)),
+    )
+
 
 class InventoryBatch(Base):
     __tablename__ = "InventoryBatch"
@@ -158,6 +260,7 @@ class Upload(Base):
     filename = Column(String, nullable=True)
     status = Column(String, nullable=False, server_default="PENDING")
     metadata_json = Column("metadata", JSON, nullable=True)
+    contentHash = Column(String, nullable=True)
 
     createdAt = Column(
         DateTime,
@@ -200,6 +303,54 @@ class AuditLog(Base):
     action = Column(String, nullable=False)
     createdAt = Column(DateTime, server_default=func.now(), nullable=False)
 
+class EmailOutbox(Base):
+    __tablename__ = "EmailOutbox"
+
+    id = Column(String, primary_key=True)
+    storeId = Column(String, nullable=True)
+    uploadId = Column(String, nullable=True)
+    template = Column(String, nullable=False)
+    # encrypted JSON request body, it carries recipient addresses
+    payload = Column(String, nullable=False)
+    # set for digested emails: keyed hash of template + recipient address
+    recipientHash = Column(String, nullable=True)
+    status = Column(String, nullable=False, server_default="PENDING")
+    attempts = Column(Integer, nullable=False, server_default="0")
+    lastError = Column(String, nullable=True)
+    nextAttemptAt = Column(DateTime, nullable=False, server_default=func.now())
+    sentAt = Column(DateTime, nullable=True)
+    createdAt = Column(DateTime, nullable=False, server_default=func.now())
+    updatedAt = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+class MedicineForecast(Base):
+    __tablename__ = "MedicineForecast"
+    __table_args__ = (UniqueConstraint("storeId", "medicineId"),)
+
+    id = Column(String, primary_key=True)
+    storeId = Column(String, ForeignKey("Store.id"), nullable=False)
+    medicineId = Column(String, ForeignKey("Medicine.id"), nullable=False)
+    horizonDays = Column(JSON, nullable=False)
+    demandModel = Column(String, nullable=True)
+    reorderNow = Column(Boolean, nullable=False, server_default="false")
+    # ForecastResponse as JSON; null when the medicine could not be forecast
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    generatedAt = Column(DateTime, nullable=False, server_default=func.now())
+
+class ForecastModel(Base):
+    __tablename__ = "ForecastModel"
+    __table_args__ = (UniqueConstraint("storeId", "medicineId"),)
+
+    id = Column(String, primary_key=True)
+    storeId = Column(String, ForeignKey("Store.id"), nullable=False)
+    medicineId = Column(String, ForeignKey("Medicine.id"), nullable=False)
+    # fingerprint of the sales series the model was fitted on
+    trainingWatermark = Column(String, nullable=False)
+    # fitted Prophet model, prophet.serialize JSON
+    modelJson = Column(String, nullable=False)
+    createdAt = Column(DateTime, nullable=False, server_default=func.now())
+    updatedAt = Column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
 class Sale(Base):
     __tablename__ = "Sale"
     id = Column(String, primary_key=True)
@@ -262,6 +413,15 @@ class ForecastRequest(BaseModel):
     store_id: str
     medicine_id: str
     horizon_days: List[int] = [7, 15, 30]
+    # "precomputed" serves the last nightly forecast instead of fitting one
+    mode: Literal["live", "precomputed"] = "live"
+
+
+class ForecastBatchRequest(BaseModel):
+    store_id: str
+    # defaults to every active medicine in the store
+    medicine_ids: Optional[List[str]] = None
+    horizon_days: List[int] = [7, 15, 30]
 
 
 class ForecastResponse(BaseModel):
@@ -269,6 +429,8 @@ class ForecastResponse(BaseModel):
     current_stock: int
 
     demand_forecast: Dict[str, int]
+    # prophet | croston_sba | ses | seasonal_naive
+    demand_model: Optional[str] = None
     reorder_quantity: Dict[str, int]
     reorder_now: bool
 
@@ -279,6 +441,18 @@ class ForecastResponse(BaseModel):
 
     price_surge_risk: Optional[PriceSurgeRisk] = None
     price_plot_data: Optional[Dict] = None
+    # set when served from the nightly precompute
+    generated_at: Optional[datetime] = None
+
+
+class ForecastJobResponse(BaseModel):
+    job_id: str
+    # QUEUED | RUNNING | SUCCEEDED | FAILED | CANCELLED
+    status: str
+    result: Optional[ForecastResponse] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
 
     
 
@@ -286,7 +460,7 @@ EMAIL_BASE_URL = os.getenv("EMAIL_BASE_URL")
 APP_LOGO_URL = "https://res.cloudinary.com/dzunpdnje/image/upload/v1765706720/SynapStore_Logo_g2tlah.png"
 
 @tool
-def send_email(
+async def send_email(
     subject: str,
     title: str,
     message: str,
@@ -357,7 +531,7 @@ def send_email(
     try:
         print(f"DEBUG: Sending email to {url} with payload keys: {list(payload.keys())}")
         
-        resp = requests.post(url, json=payload, timeout=10)
+        resp = await EMAIL_CLIENT.post(url, payload)
 
         print(f"DEBUG: Server Response Code: {resp.status_code}")
         print(f"DEBUG: Server Response Body: {resp.text}")
@@ -1244,9 +1418,36 @@ async def lifespan(app: FastAPI):
     # app.state.postgres_memory = postgres_memory
     # app.state.graph = graph
 
+    email_dispatcher_stop = threading.Event()
+    email_dispatcher = threading.Thread(
+        target=run_email_dispatcher,
+        args=(email_dispatcher_stop,),
+        name="email-outbox",
+        daemon=True,
+    )
+    email_dispatcher.start()
+
+    forecast_precompute_stop = threading.Event()
+    if FORECAST_PRECOMPUTE_HOUR >= 0:
+        threading.Thread(
+            target=run_forecast_precompute,
+            args=(forecast_precompute_stop,),
+            name="forecast-precompute",
+            daemon=True,
+        ).start()
+
     yield # Run the application
 
     # Shutdown code
+    # interrupted uploads keep their checkpoint and can be resumed
+    UPLOAD_SCHEDULER.shutdown(wait=False)
+    # unsent emails stay in the outbox for the next start
+    email_dispatcher_stop.set()
+    forecast_precompute_stop.set()
+    await run_in_threadpool(email_dispatcher.join, EMAIL_OUTBOX_POLL_SECONDS)
+    await run_in_threadpool(EMAIL_CLIENT.close)
+    FORECAST_POOL.shutdown(wait=False, cancel_futures=True)
+    FORECAST_JOBS.shutdown()
     # await checkpointer_cm.__aexit__(None, None, None)
 
 
@@ -1266,6 +1467,33 @@ def encrypt_cell(plaintext: str) -> str:
     return base64.b64encode(nonce + ct).decode("utf-8")
 
 
+# AES-GCM releases the GIL, so large columns are encrypted across a thread pool
+ENCRYPT_WORKERS = int(os.getenv("ENCRYPT_WORKERS", str(os.cpu_count() or 4)))
+# Smallest slice handed to the pool. A cell costs ~3us while a pool round trip
+# costs ~50-70us, so smaller slices spend a noticeable share of their time on
+# dispatch; columns up to this size are encrypted inline
+ENCRYPT_MIN_SLICE = 1024
+
+_encrypt_pool = ThreadPoolExecutor(max_workers=ENCRYPT_WORKERS, thread_name_prefix="encrypt")
+
+
+def _encrypt_slice(values: list) -> list:
+    return [encrypt_cell(v) for v in values]
+
+
+def encrypt_column(values: list) -> list:
+    """
+    encrypt_cell over a whole column; None stays None. Columns large enough
+    are split into one slice per worker and encrypted in parallel.
+    """
+    slice_size = max(ENCRYPT_MIN_SLICE, -(-len(values) // ENCRYPT_WORKERS))
+    if len(values) <= slice_size:
+        return _encrypt_slice(values)
+
+    slices = [values[i:i + slice_size] for i in range(0, len(values), slice_size)]
+    return [v for part in _encrypt_pool.map(_encrypt_slice, slices) for v in part]
+
+
 def decrypt_cell(ciphertext: str | None) -> str:
     if not ciphertext:
         return "Unknown"
@@ -1309,6 +1537,7 @@ app = FastAPI(title="Zenith-Core",
 
 
 app.middleware("http")(jwt_auth_middleware)
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=UPLOAD_MAX_BYTES + UPLOAD_FORM_OVERHEAD_BYTES)
 
 
 FRIENDLY_TO_KEY = {
@@ -1336,17 +1565,23 @@ EXPECTED_COLUMNS = [
     "expiry_date", "purchase_price", "mrp", "received_at", "location", "notes"
 ]
 
+# Text columns that repeat across rows (per SKU or from a small set), kept as categoricals during ingestion
+UPLOAD_CATEGORICAL_COLUMNS = [
+    "brand_name", "generic_name", "dosage_form", "strength", "uom", "category", "location",
+]
+
+
+def column_key(column) -> str:
+    c2 = str(column).strip().lower()
+    # map friendly to machine key if possible
+    if c2 in FRIENDLY_TO_KEY:
+        return FRIENDLY_TO_KEY[c2]
+    # fallback: replace spaces/hyphens with underscore
+    return c2.replace(" ", "_").replace("-", "_")
+
+
 def normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    cols = []
-    for c in df.columns:
-        c2 = str(c).strip().lower()
-        # map friendly to machine key if possible
-        if c2 in FRIENDLY_TO_KEY:
-            cols.append(FRIENDLY_TO_KEY[c2])
-        else:
-            # fallback: replace spaces/hyphens with underscore
-            cols.append(c2.replace(" ", "_").replace("-", "_"))
-    df.columns = cols
+    df.columns = [column_key(c) for c in df.columns]
     return df
 
 
@@ -1361,47 +1596,121 @@ def get_user_email(session: Session, user_id: str) -> str:
     return decrypt_cell(user.email)
 
 
-def get_store_owner_email(session: Session, store_id: str) -> str:
+_recipient_cache: Dict[tuple, tuple[float, dict]] = {}
+_recipient_cache_lock = threading.Lock()
+
+
+def resolve_upload_recipients(session: Session, store_id: str, supplier_id: Optional[str]) -> dict:
     """
-    Resolve Store Owner email via UserStoreRole → User
-    Priority: OWNER → ADMIN
+    Store name, store owner email, supplier name and supplier user email
+    for upload notifications, fetched in one joined query and cached for
+    NOTIFICATION_RECIPIENT_TTL_SECONDS per (store, supplier). Values that
+    cannot be resolved are None.
     """
-
-    role = (
-        session.query(UserStoreRole)
-        .filter(
-            UserStoreRole.storeId == store_id,
-            UserStoreRole.role.in_(["STORE_OWNER"])
-        )
-        .order_by(
-            UserStoreRole.role.asc()
-        )
+    key = (store_id, supplier_id)
+    now = time.monotonic()
+    with _recipient_cache_lock:
+        cached = _recipient_cache.get(key)
+        if cached and now - cached[0] < NOTIFICATION_RECIPIENT_TTL_SECONDS:
+            return cached[1]
+
+    owner = aliased(User)
+    supplier_user = aliased(User)
+    row = (
+        session.query(Store.name, owner.email, Supplier.name, supplier_user.email)
+        .select_from(Store)
+        .outerjoin(UserStoreRole, and_(UserStoreRole.storeId == Store.id, UserStoreRole.role == "STORE_OWNER"))
+        .outerjoin(owner, owner.id == UserStoreRole.userId)
+        .outerjoin(Supplier, Supplier.id == supplier_id)
+        .outerjoin(supplier_user, supplier_user.id == Supplier.userId)
+        .filter(Store.id == store_id)
         .first()
     )
+    if not row:
+        raise RuntimeError("Store not found")
+
+    store_name, owner_email, supplier_name, supplier_email = row
+    recipients = {
+        "store_name": decrypt_cell(store_name),
+        "store_email": decrypt_cell(owner_email) if owner_email else None,
+        "supplier_name": decrypt_cell(supplier_name) if supplier_name else None,
+        "supplier_email": decrypt_cell(supplier_email) if supplier_email else None,
+    }
 
-    if not role:
-        raise RuntimeError("No store owner/admin mapped to store")
+    with _recipient_cache_lock:
+        _recipient_cache[key] = (now, recipients)
+        # drop expired entries so the cache stays bounded by active stores
+        for stale in [k for k, (at, _) in _recipient_cache.items() if now - at >= NOTIFICATION_RECIPIENT_TTL_SECONDS]:
+            del _recipient_cache[stale]
 
-    user = session.query(User).get(role.userId)
-    if not user or not user.email:
-        raise RuntimeError("Store user email not found")
+    return recipients
 
-    return decrypt_cell(user.email)
 
+def recipient_hash(template: str, email: str) -> str:
+    return hmac.new(SECRET_KEY, f"{template}:{email.strip().lower()}".encode("utf-8"), hashlib.sha256).hexdigest()
 
-def get_supplier_user_email(session: Session, supplier_id: str) -> str:
-    supplier = session.query(Supplier).get(supplier_id)
-    if not supplier or not supplier.userId:
-        raise RuntimeError("Supplier user not linked")
 
-    user = session.query(User).get(supplier.userId)
-    if not user or not user.email:
-        raise RuntimeError("Supplier user email not found")
+def enqueue_email(
+    session: Session,
+    *,
+    template: str,
+    payload: dict,
+    store_id: Optional[str] = None,
+    upload_id: Optional[str] = None,
+    digest: bool = False,
+):
+    """
+    Adds an email to the outbox in the caller's transaction; it is sent after commit.
+    With `digest`, the email waits in its recipient's digest window and is
+    sent as part of one summary with the others in it.
+    """
+    now = datetime.utcnow()
+    next_attempt_at = now
+    recipient = None
+
+    if digest and EMAIL_DIGEST_WINDOW_SECONDS > 0:
+        recipient = recipient_hash(template, payload["to_email"])
+        # Held until commit: two uploads finishing together must not both
+        # find no open window and open one each. A row lock cannot cover
+        # that case, there is no row yet. SQLite runs one writer at a time.
+        if engine.dialect.name == "postgresql":
+            session.execute(
+                text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                {"key": f"email-digest:{recipient}"},
+            )
+        # join the recipient's open window, or open one
+        open_window = (
+            session.query(EmailOutbox.nextAttemptAt)
+            .filter(
+                EmailOutbox.recipientHash == recipient,
+                EmailOutbox.status == "PENDING",
+                EmailOutbox.attempts == 0,
+                EmailOutbox.nextAttemptAt > now,
+            )
+            .order_by(EmailOutbox.nextAttemptAt)
+            .first()
+        )
+        next_attempt_at = open_window[0] if open_window else now + timedelta(seconds=EMAIL_DIGEST_WINDOW_SECONDS)
 
-    return decrypt_cell(user.email)
+    session.add(
+        EmailOutbox(
+            id=new_uuid(),
+            storeId=store_id,
+            uploadId=upload_id,
+            template=template,
+            payload=encrypt_cell(json.dumps(payload)),
+            recipientHash=recipient,
+            status="PENDING",
+            attempts=0,
+            nextAttemptAt=next_attempt_at,
+            createdAt=now,
+            updatedAt=now,
+        )
+    )
 
 
-def send_upload_notifications(
+def enqueue_upload_notifications(
+    session: Session,
     *,
     upload_id: str,
     store_id: str,
@@ -1409,20 +1718,15 @@ def send_upload_notifications(
     processed: int,
     errors: int,
 ):
-    session = SessionLocal()
-    try:
-        upload = session.query(Upload).get(upload_id)
-        store = session.query(Store).get(store_id)
-        supplier = session.query(Supplier).get(supplier_id) if supplier_id else None
+    recipients = resolve_upload_recipients(session, store_id, supplier_id)
+    store_name = recipients["store_name"]
+    store_email = recipients["store_email"]
+    supplier_name = recipients["supplier_name"] or "Unknown Supplier"
+    supplier_email = recipients["supplier_email"]
 
-        store_name = decrypt_cell(store.name)
-        store_email = get_store_owner_email(session, store_id)
-
-        supplier_name = decrypt_cell(supplier.name) if supplier else "Unknown Supplier"
-        supplier_email = (
-            get_supplier_user_email(session, supplier_id)
-            if supplier_id else None
-        )
+    try:
+        if not store_email:
+            raise RuntimeError("No store owner/admin mapped to store")
 
         items = {
             "Medicines Uploaded": processed,
@@ -1430,54 +1734,236 @@ def send_upload_notifications(
         if errors > 0:
             items["Errors"] = errors
 
-        Thread(
-            target=send_storeowner_dispatch_email,
-            kwargs={
-                "to_email": store_email,
+        dispatch = {
+            "store_name": store_name,
+            "supplier_name": supplier_name,
+            "invoice_id": upload_id,
+            "items": items,
+            "expected_delivery": "Already Delivered",
+        }
+
+        enqueue_email(
+            session,
+            template="storeowner-dispatch",
+            payload={"to_email": store_email, **dispatch},
+            store_id=store_id,
+            upload_id=upload_id,
+            digest=True,
+        )
+
+        if supplier_email:
+            enqueue_email(
+                session,
+                template="storeowner-dispatch",
+                payload={"to_email": supplier_email, **dispatch},
+                store_id=store_id,
+                upload_id=upload_id,
+                digest=True,
+            )
+
+    except Exception as e:
+        if not supplier_email:
+            raise
+
+        enqueue_email(
+            session,
+            template="supplier-delivery-failed",
+            payload={
+                "to_email": supplier_email,
                 "store_name": store_name,
+                "store_email": store_email,
                 "supplier_name": supplier_name,
-                "invoice_id": upload.id,
-                "items": items,
-                "expected_delivery": "Already Delivered",
+                "invoice_id": upload_id,
+                "failure_reason": str(e),
             },
-            daemon=True,
-        ).start()
+            store_id=store_id,
+            upload_id=upload_id,
+        )
 
-        if supplier_email:
-            Thread(
-                target=send_storeowner_dispatch_email,
-                kwargs={
-                    "to_email": supplier_email,
-                    "store_name": store_name,
-                    "supplier_name": supplier_name,
-                    "invoice_id": upload.id,
-                    "items": items,
-                    "expected_delivery": "Already Delivered",
-                },
-                daemon=True,
-            ).start()
 
-    except Exception as e:
-        if supplier_id:
-            supplier_email = get_supplier_user_email(session, supplier_id)
-
-            Thread(
-                target=send_supplier_failure_email,
-                kwargs={
-                    "to_email": supplier_email,
-                    "store_name": store_name,
-                    "store_email": store_email,
-                    "supplier_name": supplier_name,
-                    "invoice_id": upload.id,
-                    "failure_reason": str(e),
-                },
-                daemon=True,
-            ).start()
+def claim_email_outbox_batch(session: Session) -> List[tuple[str, str, str, Optional[str], int]]:
+    """
+    Marks up to EMAIL_OUTBOX_BATCH_SIZE due emails as SENDING and returns
+    their (id, template, payload, recipientHash, attempts). Rows locked by another
+    dispatcher are skipped, so several workers can drain the outbox at once.
+    A stuck SENDING row that already used EMAIL_OUTBOX_MAX_ATTEMPTS is
+    marked DEAD instead of claimed: an email that crashes the dispatcher
+    must not be retried forever.
+    """
+    now = datetime.utcnow()
+    stuck_before = now - timedelta(seconds=EMAIL_OUTBOX_SENDING_TIMEOUT_SECONDS)
+    rows = (
+        session.query(EmailOutbox)
+        .filter(
+            or_(
+                and_(EmailOutbox.status == "PENDING", EmailOutbox.nextAttemptAt <= now),
+                and_(EmailOutbox.status == "SENDING", EmailOutbox.updatedAt < stuck_before),
+            )
+        )
+        # a digest window shares one nextAttemptAt, so its rows are claimed together
+        .order_by(EmailOutbox.nextAttemptAt, EmailOutbox.recipientHash)
+        .limit(EMAIL_OUTBOX_BATCH_SIZE)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    claimed = []
+    for row in rows:
+        if row.status == "SENDING" and row.attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+            row.status = "DEAD"
+            row.lastError = f"Dispatcher stopped while sending, {row.attempts} attempts"
+            row.updatedAt = now
+            logger.error(f"Email {row.id} ({row.template}) dead-lettered after {row.attempts} attempts: dispatcher stopped while sending")
+            continue
+        row.status = "SENDING"
+        row.attempts += 1
+        row.updatedAt = now
+        claimed.append((row.id, row.template, row.payload, row.recipientHash, row.attempts))
+    session.commit()
+    return claimed
+
+
+def outbox_retry_delay(attempts: int) -> float:
+    # capped exponential backoff with full jitter
+    return random.uniform(0, min(EMAIL_OUTBOX_RETRY_MAX_SECONDS, EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1)))
+
+
+def merge_dispatch_payloads(payloads: List[dict]) -> dict:
+    """
+    One storeowner-dispatch body summarising several: the totals of their
+    counts plus the number of uploads in `items`, and every upload id with
+    its own counts in `invoice_id`. The backend only takes positive
+    integers in `items`, so zero totals are left out.
+    """
+    totals: Dict[str, int] = {}
+    per_upload: List[str] = []
+    for p in payloads:
+        for key, value in p["items"].items():
+            totals[key] = totals.get(key, 0) + value
+        counts = ", ".join(f"{k}: {v}" for k, v in p["items"].items())
+        per_upload.append(f"{p['invoice_id']} ({counts})" if counts else p["invoice_id"])
+
+    def joined(field: str) -> str:
+        return ", ".join(dict.fromkeys(p[field] for p in payloads if p.get(field)))
+
+    return {
+        "to_email": payloads[0]["to_email"],
+        "store_name": joined("store_name"),
+        "supplier_name": joined("supplier_name"),
+        "invoice_id": "; ".join(per_upload),
+        "items": {"Uploads": len(payloads), **{k: v for k, v in totals.items() if v > 0}},
+        "expected_delivery": payloads[0]["expected_delivery"],
+    }
+
+
+def dispatch_email_outbox() -> int:
+    """
+    Sends one batch of due outbox emails through the shared email client
+    and records the outcome: SENT, PENDING with a later nextAttemptAt, or
+    DEAD once EMAIL_OUTBOX_MAX_ATTEMPTS is reached or the backend rejects
+    the request outright. Emails from one digest window go out as a
+    single summary and share its outcome. Returns how many emails were
+    claimed.
+    """
+    session = SessionLocal()
+    try:
+        claimed = claim_email_outbox_batch(session)
+        if not claimed:
+            return 0
+
+        groups: Dict[tuple, List[tuple[str, str]]] = {}
+        attempts: Dict[str, int] = {}
+        for email_id, template, payload, recipient, tries in claimed:
+            groups.setdefault((template, recipient or email_id), []).append((email_id, payload))
+            attempts[email_id] = tries
+
+        futures = []
+        # email id -> (error, retryable, retry delay shared by its group)
+        failures: Dict[str, tuple[str, bool, float]] = {}
+
+        def fail(ids: List[str], error: str, retryable: bool):
+            delay = outbox_retry_delay(max(attempts[i] for i in ids))
+            for i in ids:
+                failures[i] = (error, retryable, delay)
+
+        for (template, _), members in groups.items():
+            ids = [email_id for email_id, _ in members]
+            try:
+                bodies = [json.loads(decrypt_cell(payload)) for _, payload in members]
+                body = bodies[0] if len(bodies) == 1 else merge_dispatch_payloads(bodies)
+                futures.append((ids, send_template_email(template, body)))
+            except Exception as e:
+                fail(ids, repr(e), False)
+
+        for ids, future in futures:
+            try:
+                resp = future.result()
+            except Exception as e:
+                fail(ids, repr(e), True)
+                continue
+            if resp.status_code >= 400:
+                fail(ids, f"{resp.status_code}: {resp.text[:500]}", resp.status_code in RETRY_STATUS_CODES)
+
+        now = datetime.utcnow()
+        rows = session.query(EmailOutbox).filter(EmailOutbox.id.in_([c[0] for c in claimed])).all()
+        for row in rows:
+            if row.id not in failures:
+                row.status = "SENT"
+                row.sentAt = now
+                row.lastError = None
+                continue
+
+            error, retryable, delay = failures[row.id]
+            row.lastError = error
+            if retryable and row.attempts < EMAIL_OUTBOX_MAX_ATTEMPTS:
+                row.status = "PENDING"
+                row.nextAttemptAt = now + timedelta(seconds=delay)
+            else:
+                row.status = "DEAD"
+                logger.error(f"Email {row.id} ({row.template}) dead-lettered after {row.attempts} attempts: {error}")
+        session.commit()
 
+        return len(claimed)
     finally:
         session.close()
 
 
+def run_email_dispatcher(stop: threading.Event):
+    """Drains the outbox until `stop` is set, polling while it is empty."""
+    while not stop.is_set():
+        try:
+            claimed = dispatch_email_outbox()
+        except Exception:
+            logger.exception("Email outbox dispatch failed")
+            claimed = 0
+
+        # a full batch means there may be more due right away
+        if claimed < EMAIL_OUTBOX_BATCH_SIZE:
+            stop.wait(EMAIL_OUTBOX_POLL_SECONDS)
+
+
+def find_duplicate_upload(session: Session, store_id: str, content_hash: str) -> Upload | None:
+    """
+    Returns the earliest non-failed upload of the same file for this store
+    within the dedup window, if any. Previews do not count: they never
+    touched inventory, so applying the same file afterwards must go ahead.
+    """
+    if UPLOAD_DEDUP_WINDOW_HOURS <= 0:
+        return None
+
+    since = datetime.utcnow() - timedelta(hours=UPLOAD_DEDUP_WINDOW_HOURS)
+    return (
+        session.query(Upload)
+        .filter(
+            Upload.storeId == store_id,
+            Upload.contentHash == content_hash,
+            Upload.createdAt >= since,
+            Upload.status.notin_(("FAILED", "PREVIEW_READY")),
+        )
+        .order_by(Upload.createdAt.asc())
+        .first()
+    )
+
 
 def log_upload_activity(
     session: Session,
@@ -1516,7 +2002,8 @@ def safe_parse_datetime(series: pd.Series) -> pd.Series:
     """
     Cleans garbage timestamps and parses safely.
     - Removes invalid timezone suffixes
-    - Forces datetime parsing
+    - Forces datetime parsing, each value on its own
+    - Converts values with a UTC offset to naive UTC
     - Returns NaT for invalid rows
     """
     def clean(val):
@@ -1531,269 +2018,746 @@ def safe_parse_datetime(series: pd.Series) -> pd.Series:
 
     cleaned = series.apply(clean)
 
+    # utc=True: offset-aware values (mixed offsets too) cannot go into a naive column as is
     return pd.to_datetime(
         cleaned,
         errors="coerce",
-        utc=False
+        utc=True,
+        format="mixed",
+    ).dt.tz_localize(None)
+
+
+# Formats seen in supplier sheets, in tie-break order. Month-first variants come
+# before day-first ones, so a column where both fit every value (06/01/2027) is
+# read month-first, as pd.to_datetime always read these files.
+UPLOAD_DATE_FORMATS = [
+    "%Y-%m-%d",
+    "%m/%d/%Y",
+    "%d/%m/%Y",
+    "%m-%d-%Y",
+    "%d-%m-%Y",
+    "%m.%d.%Y",
+    "%d.%m.%Y",
+    "%Y/%m/%d",
+    "%d-%b-%Y",
+    "%d %b %Y",
+    "%b %d, %Y",
+    "%m/%d/%y",
+    "%d/%m/%y",
+    "%Y-%m-%d %H:%M:%S",
+    "%Y-%m-%dT%H:%M:%S",
+    "%m/%d/%Y %H:%M",
+    "%d/%m/%Y %H:%M",
+    "%m/%Y",
+]
+# Distinct values tried against every format when detecting a column's formats
+DATE_FORMAT_SAMPLE_SIZE = 200
+
+
+def parse_date_column(series: pd.Series) -> pd.Series:
+    """
+    Parses a supplier date column without per-element format inference.
+    - Parses each distinct value once (supplier dates repeat heavily)
+    - Detects which known formats the column uses from a sample
+    - Parses with the best format in one vectorized pass, then what is
+      left with the next formats that matched the sample
+    - Sends only values no format matched through safe_parse_datetime
+    - Returns NaT for invalid rows
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    codes, distinct = pd.factorize(series)
+    if len(distinct) == 0:
+        # blank column, e.g. an optional "Received At" left empty
+        return pd.Series(pd.NaT, index=series.index, dtype="datetime64[ns]")
+
+    if pd.api.types.infer_dtype(distinct, skipna=True) in ("datetime", "datetime64", "date"):
+        # Excel cells that are already dates
+        return pd.to_datetime(series, errors="coerce")
+
+    text = pd.Series(distinct, dtype=object).astype("string").str.strip()
+    text = text.mask(text == "")
+
+    sample = text.dropna().head(DATE_FORMAT_SAMPLE_SIZE)
+    hits = {
+        fmt: pd.to_datetime(sample, format=fmt, errors="coerce").notna().sum()
+        for fmt in UPLOAD_DATE_FORMATS
+    }
+    # stable sort: formats matching as many values keep their UPLOAD_DATE_FORMATS order
+    ranked = sorted(
+        (fmt for fmt, count in hits.items() if count),
+        key=lambda fmt: -hits[fmt],
     )
 
+    parsed = pd.Series(pd.NaT, index=text.index, dtype="datetime64[ns]")
+    remaining = text.notna()
 
-def update_upload_progress(
-    upload_id: str,
-    total: int,
-    processed: int,
-    errors: int,
-    inserted: int,
-    phase: str = "PROCESSING",
-):
-    progress_session = SessionLocal()
-    try:
-        percent = round(((processed + errors) / max(total, 1)) * 100)
+    for fmt in ranked:
+        if not remaining.any():
+            break
+        attempt = pd.to_datetime(text[remaining], format=fmt, errors="coerce").dropna()
+        parsed[attempt.index] = attempt
+        remaining[attempt.index] = False
 
-        upload = progress_session.query(Upload).get(upload_id)
-        if upload:
-            upload.metadata_json = {
-                "totalRows": total,
-                "processedRows": processed,
-                "insertedRows": inserted,
-                "errorRows": errors,
-                "progressPercent": percent,
-                "phase": phase,
-            }
-            progress_session.commit()
-    finally:
-        progress_session.close()
+    if remaining.any():
+        parsed[remaining] = safe_parse_datetime(text[remaining].astype(object))
 
+    # factorize marks missing cells with -1
+    values = parsed.to_numpy()[codes]
+    values[codes == -1] = np.datetime64("NaT")
+    return pd.Series(values, index=series.index)
 
 
-def process_supplier_medicine_upload(
-    upload_id: str,
-    store_id: str,
-    supplier_id: Optional[str],
-    file_path: str
-):
+def load_upload_frame(file_path: str) -> pd.DataFrame:
     """
-    Background job:
-    - Reads supplier Excel
-    - Cleans + validates
-    - Skips expired medicines
-    - Inserts Medicine, InventoryBatch, StockMovement
-    - Updates progress smoothly (no decimal spam)
-    - Notifies uploader on completion
+    Reads a supplier file (Excel, or CSV by extension) and normalizes its
+    column names. Columns the upload does not use are never loaded.
+    Raises ValueError when expected columns are missing.
     """
+    usecols = lambda c: column_key(c) in EXPECTED_COLUMNS
+    if str(file_path).lower().endswith(".csv"):
+        df = pd.read_csv(file_path, usecols=usecols)
+    else:
+        df = pd.read_excel(file_path, usecols=usecols)
+    df = normalize_columns(df)
 
-    session: Session = SessionLocal()
-    processed = 0
-    inserted = 0
-    errors = 0
-    messages: List[str] = []
+    missing = set(EXPECTED_COLUMNS) - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
 
-    try:
-        upload = session.get(Upload, upload_id)
-        if not upload:
-            return
+    return df
 
-        # Load & normalize Excel
-        df = pd.read_excel(file_path)
-        df = normalize_columns(df)
 
-        missing = set(EXPECTED_COLUMNS) - set(df.columns)
-        if missing:
-            raise ValueError(f"Missing columns: {', '.join(sorted(missing))}")
+def clean_upload_frame(df: pd.DataFrame, today: Optional[datetime] = None) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Coerces column types and splits the frame into rows that can be
+    ingested and rejected rows. Both keep the file row offset as index;
+    rejected rows keep their original content plus a "reason" column.
+    Expiry is checked against `today`, by default the current time.
+
+    Repeated text columns become categoricals and quantities the smallest
+    integer type that holds them. Prices stay float64 so amounts keep
+    their cents.
+    """
+    # Columns are replaced below, not modified, so this keeps the values as read
+    raw = df.copy(deep=False)
 
-        # Cleaning & parsing (safe + strict)
-        df["medicine_sku"] = df["medicine_sku"].astype(str).str.strip().str.lower()
-        df["ndc"] = df["ndc"].astype(str).str.strip().str.lower().replace({"nan": None})
+    # Cleaning & parsing (safe + strict)
+    df["medicine_sku"] = df["medicine_sku"].astype(str).str.strip().str.lower()
+    df["ndc"] = df["ndc"].astype(str).str.strip().str.lower().replace({"nan": None})
 
-        df["qty_received"] = (
-            pd.to_numeric(df["qty_received"], errors="coerce")
-            .fillna(0)
-            .astype(int)
-        )
+    for column in UPLOAD_CATEGORICAL_COLUMNS:
+        df[column] = df[column].astype("category")
 
-        df["expiry_date"] = pd.to_datetime(
-            df["expiry_date"], errors="coerce"
-        )
+    qty = pd.to_numeric(df["qty_received"], errors="coerce").fillna(0).astype(np.int64)
+    df["qty_received"] = pd.to_numeric(qty, downcast="integer")
 
-        df["received_at"] = pd.to_datetime(
-            df["received_at"], errors="coerce"
-        ).fillna(datetime.utcnow())
+    df["expiry_date"] = parse_date_column(df["expiry_date"])
 
-        df["purchase_price"] = pd.to_numeric(df["purchase_price"], errors="coerce")
-        df["mrp"] = pd.to_numeric(df["mrp"], errors="coerce")
+    df["received_at"] = parse_date_column(df["received_at"]).fillna(datetime.utcnow())
 
-        # Drop invalid rows early
-        df = df[
-            (df["qty_received"] > 0)
-            & (df["expiry_date"].notna())
-        ]
+    df["purchase_price"] = pd.to_numeric(df["purchase_price"], errors="coerce")
+    df["mrp"] = pd.to_numeric(df["mrp"], errors="coerce")
 
-        # Remove expired medicines
-        today = datetime.utcnow()
-        df = df[df["expiry_date"] > today]
+    # Invalid and expired rows, first matching reason wins
+    today = today or datetime.utcnow()
+    reason = np.select(
+        [
+            df["qty_received"] <= 0,
+            df["expiry_date"].isna(),
+            df["expiry_date"] <= today,
+        ],
+        [
+            "Quantity received must be greater than zero",
+            "Missing or invalid expiry date",
+            "Medicine already expired",
+        ],
+        default="",
+    )
+    valid = reason == ""
 
-        total_rows = len(df)
+    rejected = raw.loc[~valid, EXPECTED_COLUMNS].assign(reason=reason[~valid])
+    if valid.all():
+        return df, rejected
+    return df[valid], rejected
 
-        # Init progress
-        upload.status = "PROCESSING"
-        upload.metadata_json = {
-            "totalRows": total_rows,
-            "processedRows": 0,
-            "insertedRows": 0,
-            "errorRows": 0,
-            "progressPercent": 0,
-            "phase": "PROCESSING",
-        }
-        session.commit()
 
-        last_reported_percent = -1
+def rejected_report_path(upload_id: str) -> str:
+    return str(UPLOAD_STORE / f"{upload_id}.rejected.csv")
 
-        # Cache existing medicines
-        meds = session.query(Medicine).filter(Medicine.storeId == store_id).all()
-        sku_map = {m.sku.lower(): m.id for m in meds if m.sku}
-        ndc_map = {m.ndc.lower(): m.id for m in meds if m.ndc}
 
-        created_keys: Dict[tuple, str] = {}
+def parsed_frame_path(key: str) -> str:
+    return str(UPLOAD_STORE / f"{key}.parsed.parquet")
 
-        # Main loop
-        for idx, row in df.iterrows():
-            try:
-                now = datetime.utcnow()
-                sku = row["medicine_sku"]
-                ndc = row.get("ndc")
-
-                med_id = sku_map.get(sku) or (ndc_map.get(ndc) if ndc else None)
-
-               
-                # Create medicine if needed
-                if not med_id:
-                    key = (sku, row.get("dosage_form"), row.get("strength"))
-                    if key in created_keys:
-                        med_id = created_keys[key]
-                    else:
-                        med = Medicine(
-                            id=new_uuid(),
-                            storeId=store_id,
-                            sku=clean_value(sku),
-                            ndc=clean_value(ndc),
-                            brandName=encrypt_cell(
-                                clean_value(row.get("brand_name"))
-                                or clean_value(row.get("generic_name"))
-                                or "UNKNOWN"
-                            ),
-                            genericName=encrypt_cell(clean_value(row.get("generic_name")))
-                            if clean_value(row.get("generic_name")) else None,
-                            dosageForm=encrypt_cell(clean_value(row.get("dosage_form")))
-                            if clean_value(row.get("dosage_form")) else None,
-                            strength=encrypt_cell(
-                                clean_value(row.get("strength"), default="Not Specified")
-                            ),
-                            uom=clean_value(row.get("uom")),
-                            category=encrypt_cell(clean_value(row.get("category")))
-                            if clean_value(row.get("category")) else None,
-                            isActive=True,
-                            createdAt=now,
-                            updatedAt=now,
-                        )
-                        session.add(med)
-                        session.flush()
 
-                        med_id = med.id
-                        created_keys[key] = med_id
-                        if sku:
-                            sku_map[sku] = med_id
-                        if ndc:
-                            ndc_map[ndc] = med_id
+def remove_upload_files(*paths: Optional[str]):
+    for path in paths:
+        try:
+            if path:
+                os.remove(path)
+        except OSError:
+            pass
 
-                
-                # Inventory batch
-                inv = InventoryBatch(
-                    id=new_uuid(),
-                    storeId=store_id,
-                    medicineId=med_id,
-                    batchNumber=encrypt_cell(row.get("batch_number"))
-                    if clean_value(row.get("batch_number")) else None,
-                    qtyReceived=int(row["qty_received"]),
-                    qtyAvailable=int(row["qty_received"]),
-                    expiryDate=row["expiry_date"].to_pydatetime(),
-                    purchasePrice=float(row["purchase_price"])
-                    if not pd.isna(row["purchase_price"]) else None,
-                    mrp=float(row["mrp"]) if not pd.isna(row["mrp"]) else None,
-                    receivedAt=row["received_at"].to_pydatetime(),
-                    location=encrypt_cell(row.get("location"))
-                    if clean_value(row.get("location")) else None,
-                    createdAt=now,
-                    updatedAt=now,
-                )
 
-                session.add(inv)
-                session.flush()
-
-                # Stock movement (RECEIPT)
-                session.add(
-                    StockMovement(
-                        id=new_uuid(),
-                        storeId=store_id,
-                        inventoryId=inv.id,
-                        medicineId=med_id,
-                        delta=int(row["qty_received"]),
-                        reason="RECEIPT",
-                        note=encrypt_cell(f"Supplier:{supplier_id}")
-                        if supplier_id else None,
-                        createdAt=now,
-                    )
-                )
+def preview_supplier_upload(upload_id: str, store_id: str, file_path: str) -> dict:
+    """
+    Dry run of an upload: parses and validates the file, matches rows
+    against the store catalog and caches the parsed frame for a later
+    apply. Nothing is written to the catalog or inventory.
+    """
+    df = load_upload_frame(file_path)
+    total_rows = len(df)
+    valid, rejected = clean_upload_frame(df)
 
-                processed += 1
-                inserted += 1
+    session = SessionLocal()
+    try:
+        catalog = (
+            session.query(Medicine.sku, Medicine.ndc)
+            .filter(Medicine.storeId == store_id)
+            .all()
+        )
+        known_skus = {sku.strip().lower() for sku, _ in catalog if sku}
+        known_ndcs = {ndc.strip().lower() for _, ndc in catalog if ndc}
 
-                # Throttled progress update
-                current_percent = int(
-                    ((processed + errors) * 100) / max(total_rows, 1)
-                )
+        matched = valid["medicine_sku"].isin(known_skus) | valid["ndc"].isin(known_ndcs)
 
-                if current_percent > last_reported_percent:
-                    update_upload_progress(
-                        upload_id=upload_id,
-                        total=total_rows,
-                        processed=processed,
-                        errors=errors,
-                        inserted=inserted,
-                        phase="PROCESSING",
-                    )
-                    last_reported_percent = current_percent
+        summary = {
+            "totalRows": total_rows,
+            "validRows": len(valid),
+            "rejectedRows": len(rejected),
+            "existingMedicineRows": int(matched.sum()),
+            "newMedicineRows": int((~matched).sum()),
+            "newMedicines": int(valid.loc[~matched, "medicine_sku"].nunique()),
+            "totalUnits": int(valid["qty_received"].sum()),
+            "rejectionReasons": rejected["reason"].value_counts().to_dict(),
+        }
+        row_errors = [
+            {"row": int(idx), "reason": reason}
+            for idx, reason in rejected["reason"].head(UPLOAD_PREVIEW_MAX_ERRORS).items()
+        ]
 
-            except Exception as exc:
-                session.rollback()
-                errors += 1
-                if len(messages) < 50:
-                    messages.append(f"Row {idx}: {str(exc)}")
+        parsed_path = parsed_frame_path(upload_id)
+        valid.to_parquet(parsed_path)
 
-        # Finalize
-        upload.status = "APPLIED" if errors == 0 else "PREVIEW_READY"
+        rejected_path = rejected_report_path(upload_id)
+        with RejectedRowsReport(rejected_path, EXPECTED_COLUMNS, truncate=True) as report:
+            report.write_frame(rejected)
+            rejected_bytes = report.flush()
+
+        upload = session.get(Upload, upload_id)
+        upload.status = "PREVIEW_READY"
+        upload.metadata_json = {
+            **(upload.metadata_json or {}),
+            "phase": "PREVIEW_READY",
+            "parsedPath": parsed_path,
+            "preview": summary,
+            "rejectedPath": rejected_path,
+            "rejectedRows": len(rejected),
+            "rejectedBytes": rejected_bytes,
+        }
         session.commit()
 
-        update_upload_progress(
-            upload_id=upload_id,
-            total=total_rows,
-            processed=processed,
-            errors=errors,
-            inserted=inserted,
-            phase="COMPLETED",
-        )
+        return {"summary": summary, "errors": row_errors}
+    finally:
+        session.close()
 
-        Thread(
-            target=send_upload_notifications,
-            kwargs={
-                "upload_id": upload_id,
-                "store_id": store_id,
-                "supplier_id": supplier_id,
-                "processed": inserted,
-                "errors": errors,
-            },
-            daemon=True,
-        ).start()
 
+MEDICINE_ENCRYPTED_FIELDS = ("brandName", "genericName", "dosageForm", "strength", "category")
+
+
+def medicine_values(rows: List[pd.Series], store_id: str, now: datetime) -> List[dict]:
+    """
+    Column values for new Medicines built from upload rows. Encrypted
+    fields are encrypted column-wise with encrypt_column.
+    """
+    values = [
+        {
+            "id": new_uuid(),
+            "storeId": store_id,
+            "sku": clean_value(row["medicine_sku"]),
+            "ndc": clean_value(row.get("ndc")),
+            "brandName": clean_value(row.get("brand_name"))
+            or clean_value(row.get("generic_name"))
+            or "UNKNOWN",
+            "genericName": clean_value(row.get("generic_name")),
+            "dosageForm": clean_value(row.get("dosage_form")),
+            "strength": clean_value(row.get("strength"), default="Not Specified"),
+            "uom": clean_value(row.get("uom")),
+            "category": clean_value(row.get("category")),
+            "isActive": True,
+            "createdAt": now,
+            "updatedAt": now,
+        }
+        for row in rows
+    ]
+
+    for field in MEDICINE_ENCRYPTED_FIELDS:
+        encrypted = encrypt_column([v[field] for v in values])
+        for v, enc in zip(values, encrypted):
+            v[field] = enc
+
+    return values
+
+
+def encrypt_batch_columns(chunk: pd.DataFrame, supplier_id: Optional[str]) -> Dict[str, list]:
+    """Encrypted batchNumber, location and movement note for every row of a chunk."""
+    note = f"Supplier:{supplier_id}" if supplier_id else None
+    return {
+        "batchNumber": encrypt_column([clean_value(v) for v in chunk["batch_number"]]),
+        "location": encrypt_column([clean_value(v) for v in chunk["location"]]),
+        "note": encrypt_column([note] * len(chunk)),
+    }
+
+
+def dialect_insert(model):
+    """INSERT construct for the engine's dialect, so ON CONFLICT also works on SQLite."""
+    if engine.dialect.name == "sqlite":
+        return sqlite_insert(model)
+    return pg_insert(model)
+
+
+def resolve_chunk_medicines(
+    session: Session,
+    store_id: str,
+    chunk: pd.DataFrame,
+    sku_map: Dict[str, str],
+    ndc_map: Dict[str, str],
+):
+    """
+    Resolves medicine ids for the SKUs and NDCs of one chunk into sku_map
+    and ndc_map. Unknown SKUs are created with a single
+    INSERT ... ON CONFLICT DO NOTHING on the unique SKU index, so
+    concurrent uploads converge on the same row. Only id/sku/ndc are read
+    back.
+
+    clean_upload_frame trims and lower-cases SKUs and NDCs; stored values
+    keep whatever case they were entered with, so lookups compare
+    normalized_code(column), the form the ("storeId", sku) and
+    ("storeId", ndc) expression indexes hold. A SKU identifies one medicine
+    regardless of dosage form or strength, as it did when existing
+    medicines were matched from the in-memory sku_map.
+    """
+    has_sku = chunk["medicine_sku"].map(lambda v: clean_value(v) is not None)
+    has_ndc = chunk["ndc"].map(lambda v: clean_value(v) is not None)
+
+    skus = set(chunk.loc[has_sku, "medicine_sku"]) - sku_map.keys()
+    ndcs = set(chunk.loc[has_ndc, "ndc"]) - ndc_map.keys()
+
+    def lookup(sku_keys, ndc_keys):
+        sku_code, ndc_code = normalized_code(Medicine.sku), normalized_code(Medicine.ndc)
+        conditions = []
+        if sku_keys:
+            conditions.append(sku_code.in_(sku_keys))
+        if ndc_keys:
+            conditions.append(ndc_code.in_(ndc_keys))
+        if not conditions:
+            return
+
+        rows = (
+            session.query(Medicine.id, sku_code, ndc_code)
+            .filter(Medicine.storeId == store_id, or_(*conditions))
+            .all()
+        )
+        for med_id, sku, ndc in rows:
+            if sku:
+                sku_map.setdefault(sku, med_id)
+            if ndc:
+                ndc_map.setdefault(ndc, med_id)
+
+    lookup(list(skus), list(ndcs))
+
+    # first row of every SKU that matched neither by SKU nor by NDC
+    unresolved = chunk[
+        has_sku
+        & ~chunk["medicine_sku"].isin(list(sku_map))
+        & ~chunk["ndc"].isin(list(ndc_map))
+    ].drop_duplicates("medicine_sku")
+    if unresolved.empty:
+        return
+
+    now = datetime.utcnow()
+    new_rows = medicine_values([row for _, row in unresolved.iterrows()], store_id, now)
+
+    session.execute(
+        dialect_insert(Medicine)
+        .values(new_rows)
+        .on_conflict_do_nothing(index_elements=[Medicine.storeId, normalized_code(Medicine.sku)])
+    )
+    lookup([r["sku"] for r in new_rows], [])
+
+
+def update_upload_progress(
+    upload_id: str,
+    total: int,
+    processed: int,
+    errors: int,
+    inserted: int,
+    phase: str = "PROCESSING",
+    status: str | None = None,
+    session: Session | None = None,
+):
+    """
+    Publishes progress to the in-process channel (coalesced by time) and
+    persists it to the Upload row only when the phase changes.
+
+    The write goes through `session` (and commits it) when given, else
+    through a session of its own. A job holding an open transaction must
+    pass its session: a second writer would wait on the job's own lock
+    on databases that lock the whole file (SQLite).
+    """
+    percent = round(((processed + errors) / max(total, 1)) * 100)
+    snapshot = {
+        "totalRows": total,
+        "processedRows": processed,
+        "insertedRows": inserted,
+        "errorRows": errors,
+        "progressPercent": percent,
+        "phase": phase,
+        "updatedAt": datetime.utcnow().isoformat(),
+    }
+    if status:
+        snapshot["status"] = status
+
+    if not UPLOAD_PROGRESS.publish(upload_id, snapshot):
+        return
+
+    progress_session = session or SessionLocal()
+    try:
+        upload = progress_session.get(Upload, upload_id)
+        if upload:
+            # Merge so upload details and the resume checkpoint survive progress updates
+            meta = dict(upload.metadata_json or {})
+            meta.update({
+                "totalRows": total,
+                "processedRows": processed,
+                "insertedRows": inserted,
+                "errorRows": errors,
+                "progressPercent": percent,
+                "phase": phase,
+            })
+            upload.metadata_json = meta
+            progress_session.commit()
+    finally:
+        if progress_session is not session:
+            progress_session.close()
+
+
+def checkpoint_upload(
+    session: Session,
+    upload: Upload,
+    *,
+    last_row: int,
+    total: int,
+    processed: int,
+    errors: int,
+    inserted: int,
+    rejected: int,
+    rejected_bytes: int,
+):
+    """
+    Commits the current chunk together with its progress and the offset
+    of the last row it covered, so a resumed job can skip applied rows.
+    The rejected-rows report size is kept with it, so a resumed job can
+    drop lines of a chunk that never committed.
+    """
+    meta = dict(upload.metadata_json or {})
+    meta.update({
+        "totalRows": total,
+        "processedRows": processed,
+        "insertedRows": inserted,
+        "errorRows": errors,
+        "progressPercent": round(((processed + errors) / max(total, 1)) * 100),
+        "phase": "PROCESSING",
+        "lastCommittedRow": int(last_row),
+        "rejectedRows": rejected,
+        "rejectedBytes": rejected_bytes,
+    })
+    upload.metadata_json = meta
+    session.commit()
+
+    UPLOAD_PROGRESS.publish(
+        upload.id,
+        {**meta, "status": upload.status, "updatedAt": datetime.utcnow().isoformat()},
+    )
+
+
+def process_supplier_medicine_upload(
+    upload_id: str,
+    store_id: str,
+    supplier_id: Optional[str],
+    file_path: str
+):
+    """
+    Background job:
+    - Reads supplier Excel
+    - Cleans + validates
+    - Skips expired medicines
+    - Inserts Medicine, InventoryBatch, StockMovement in committed chunks
+    - Writes every rejected or failed row to the upload's rejected-rows report
+    - Checkpoints the last committed row so an interrupted job can resume
+    - Notifies uploader on completion
+    """
+
+    session: Session = SessionLocal()
+    processed = 0
+    inserted = 0
+    errors = 0
+    rejected_rows = 0
+    messages: List[str] = []
+    report: Optional[RejectedRowsReport] = None
+
+    try:
+        upload = session.get(Upload, upload_id)
+        if not upload or upload.status in ("APPLIED", "APPLIED_WITH_ERRORS"):
+            return
+
+        # Resume point: rows up to this file offset were committed by a previous run
+        meta = upload.metadata_json or {}
+        last_committed_row = meta.get("lastCommittedRow", -1)
+        resuming = last_committed_row >= 0
+        if resuming:
+            processed = meta.get("processedRows", 0)
+            inserted = meta.get("insertedRows", 0)
+            errors = meta.get("errorRows", 0)
+
+        # A resumed run first rebuilds the rejections the interrupted run
+        # reported, checking expiry at the time that run did
+        expiry_checked_at = datetime.utcnow()
+        reported_at = expiry_checked_at
+        if resuming and meta.get("expiryCheckedAt"):
+            reported_at = datetime.fromisoformat(meta["expiryCheckedAt"])
+
+        # Parsed frame from a preview, or parse the file now
+        parsed_path = meta.get("parsedPath")
+        if parsed_path and os.path.exists(parsed_path):
+            df = pd.read_parquet(parsed_path)
+            # time has passed since the preview, so expiry is checked again
+            expired = df["expiry_date"] <= reported_at
+            rejected = df.loc[expired, EXPECTED_COLUMNS].assign(reason="Medicine already expired")
+            if expired.any():
+                df = df[~expired]
+            # the preview already reported the rows it rejected
+            truncate_report = False
+        else:
+            df, rejected = clean_upload_frame(load_upload_frame(file_path), today=reported_at)
+            truncate_report = not resuming
+
+        if resuming:
+            # Rows expired since then are rejected now. Those in committed
+            # chunks were ingested; the pending ones were never reported,
+            # since the report is cut back to the last checkpoint
+            pending = df.index > last_committed_row
+            expired = pending & (df["expiry_date"] <= expiry_checked_at)
+            rejected = df.loc[expired, EXPECTED_COLUMNS].assign(reason="Medicine already expired")
+            if expired.any():
+                df = df[~expired]
+
+        # Rejected rows were reported by the run that got this far; lines
+        # a crashed run wrote after its last checkpoint are cut off
+        report = RejectedRowsReport(
+            meta.get("rejectedPath") or rejected_report_path(upload_id),
+            EXPECTED_COLUMNS,
+            truncate=truncate_report,
+            resume_at=meta.get("rejectedBytes"),
+        )
+        if not truncate_report:
+            rejected_rows = meta.get("rejectedRows", 0)
+        report.write_frame(rejected)
+        del rejected
+
+        total_rows = len(df)
+
+        # Init progress (counters are kept when resuming)
+        upload.status = "PROCESSING"
+        meta = dict(upload.metadata_json or {})
+        meta.update({
+            "totalRows": total_rows,
+            "processedRows": processed,
+            "insertedRows": inserted,
+            "errorRows": errors,
+            "progressPercent": round(((processed + errors) / max(total_rows, 1)) * 100),
+            "phase": "PROCESSING",
+            "rejectedPath": report.path,
+            "rejectedRows": rejected_rows + report.written,
+            "rejectedBytes": report.flush(),
+            # committed with the report size, so a later resume knows which expired rows it holds
+            "expiryCheckedAt": expiry_checked_at.isoformat(),
+        })
+        upload.metadata_json = meta
+        session.commit()
+
+        UPLOAD_PROGRESS.discard(upload_id)
+        UPLOAD_PROGRESS.publish(upload_id, {
+            **meta,
+            "status": "PROCESSING",
+            "createdAt": upload.createdAt.isoformat(),
+            "updatedAt": datetime.utcnow().isoformat(),
+        })
+
+        # Filled chunk by chunk from the database, never the whole catalog
+        sku_map: Dict[str, str] = {}
+        ndc_map: Dict[str, str] = {}
+
+        created_keys: Dict[tuple, str] = {}
+
+        # The index still holds each row's offset in the file (ascending), so
+        # skipping by offset is deterministic regardless of which rows were
+        # filtered; chunks are positional slices, not filtered copies
+        first_pending = df.index.searchsorted(last_committed_row, side="right")
+
+        # Main loop, one transaction per chunk
+        for start in range(first_pending, len(df), UPLOAD_CHUNK_SIZE):
+            chunk = df.iloc[start:start + UPLOAD_CHUNK_SIZE]
+
+            resolve_chunk_medicines(session, store_id, chunk, sku_map, ndc_map)
+            encrypted = encrypt_batch_columns(chunk, supplier_id)
+
+            for pos, (idx, row) in enumerate(chunk.iterrows()):
+                created_med = None
+                try:
+                    # Each row runs in its own SAVEPOINT so a failure only
+                    # discards that row, not the rest of the chunk
+                    with session.begin_nested():
+                        now = datetime.utcnow()
+                        sku = row["medicine_sku"]
+                        ndc = row.get("ndc")
+
+                        med_id = sku_map.get(sku) or (ndc_map.get(ndc) if ndc else None)
+
+
+                        # Create medicine if needed
+                        if not med_id:
+                            key = (sku, row.get("dosage_form"), row.get("strength"))
+                            if key in created_keys:
+                                med_id = created_keys[key]
+                            else:
+                                # rows without a SKU cannot go through the upsert
+                                med = Medicine(**medicine_values([row], store_id, now)[0])
+                                session.add(med)
+                                session.flush()
+
+                                med_id = med.id
+                                created_med = (key, sku, ndc)
+
+
+                        # Inventory batch
+                        inv = InventoryBatch(
+                            id=new_uuid(),
+                            storeId=store_id,
+                            medicineId=med_id,
+                            batchNumber=encrypted["batchNumber"][pos],
+                            qtyReceived=int(row["qty_received"]),
+                            qtyAvailable=int(row["qty_received"]),
+                            expiryDate=row["expiry_date"].to_pydatetime(),
+                            purchasePrice=float(row["purchase_price"])
+                            if not pd.isna(row["purchase_price"]) else None,
+                            mrp=float(row["mrp"]) if not pd.isna(row["mrp"]) else None,
+                            receivedAt=row["received_at"].to_pydatetime(),
+                            location=encrypted["location"][pos],
+                            createdAt=now,
+                            updatedAt=now,
+                        )
+
+                        session.add(inv)
+                        session.flush()
+
+                        # Stock movement (RECEIPT)
+                        session.add(
+                            StockMovement(
+                                id=new_uuid(),
+                                storeId=store_id,
+                                inventoryId=inv.id,
+                                medicineId=med_id,
+                                delta=int(row["qty_received"]),
+                                reason="RECEIPT",
+                                note=encrypted["note"][pos],
+                                createdAt=now,
+                            )
+                        )
+                        session.flush()
+
+                except Exception as exc:
+                    # The savepoint is already rolled back; earlier rows stay pending
+                    errors += 1
+                    if len(messages) < 50:
+                        messages.append(f"Row {idx}: {str(exc)}")
+                    report.write_row(idx, row, str(exc))
+                    continue
+
+                # Only cache a new medicine once its row made it past the savepoint
+                if created_med:
+                    key, sku, ndc = created_med
+                    created_keys[key] = med_id
+                    if sku:
+                        sku_map[sku] = med_id
+                    if ndc:
+                        ndc_map[ndc] = med_id
+
+                processed += 1
+                inserted += 1
+
+                # Live progress only; the chunk checkpoint persists it
+                update_upload_progress(
+                    upload_id=upload_id,
+                    total=total_rows,
+                    processed=processed,
+                    errors=errors,
+                    inserted=inserted,
+                    phase="PROCESSING",
+                )
+
+            # Commit the chunk together with its checkpoint; the chunk's
+            # failed rows are on disk first so a crash cannot lose them
+            rejected_bytes = report.flush()
+            checkpoint_upload(
+                session,
+                upload,
+                last_row=chunk.index[-1],
+                total=total_rows,
+                processed=processed,
+                errors=errors,
+                inserted=inserted,
+                rejected=rejected_rows + report.written,
+                rejected_bytes=rejected_bytes,
+            )
+
+        # Finalize
+        upload.status = "APPLIED" if errors == 0 else "APPLIED_WITH_ERRORS"
+        meta = {**(upload.metadata_json or {}), "rejectedRows": rejected_rows + report.written}
+        if messages:
+            meta["messages"] = messages
+        upload.metadata_json = meta
+        session.commit()
+
+        update_upload_progress(
+            upload_id=upload_id,
+            total=total_rows,
+            processed=processed,
+            errors=errors,
+            inserted=inserted,
+            phase="COMPLETED",
+            status=upload.status,
+            session=session,
+        )
+
+        # The upload is committed; a notification problem must not fail it.
+        # A savepoint keeps a failed enqueue (e.g. a flush error) from
+        # breaking the session the activity log commits on below.
+        try:
+            with session.begin_nested():
+                enqueue_upload_notifications(
+                    session,
+                    upload_id=upload_id,
+                    store_id=store_id,
+                    supplier_id=supplier_id,
+                    processed=inserted,
+                    errors=errors,
+                )
+        except Exception:
+            logger.exception(f"Upload {upload_id}: notifications could not be queued")
+
+        # Activity log and outbox emails commit together
         log_upload_activity(
             session=session,
             store_id=store_id,
@@ -1803,27 +2767,112 @@ def process_supplier_medicine_upload(
         )
         session.commit()
 
+        # Nothing left to resume, the source file can go
+        for path in (file_path, parsed_path):
+            try:
+                if path:
+                    os.remove(path)
+            except Exception:
+                pass
+
     except Exception as exc:
         session.rollback()
         upload = session.get(Upload, upload_id)
+        failure = {"phase": "FAILED", "status": "FAILED"}
         if upload:
-            upload.status = "FAILED"
-            upload.metadata_json = {
-                "processedRows": processed,
-                "insertedRows": inserted,
-                "errorRows": errors + 1,
+            # Keep the checkpoint and file path so the upload can be resumed.
+            # The row counters stay at the last committed chunk (the failed
+            # one was rolled back); the failure itself is only the status and
+            # its message.
+            meta = dict(upload.metadata_json or {})
+            meta.update({
                 "phase": "FAILED",
                 "messages": messages + [str(exc)],
-            }
+            })
+            upload.status = "FAILED"
+            upload.metadata_json = meta
             session.commit()
 
+            # live progress may be ahead of the checkpoint, bring it back
+            failure.update({
+                key: meta[key]
+                for key in ("processedRows", "insertedRows", "errorRows", "progressPercent")
+                if key in meta
+            })
+
+        UPLOAD_PROGRESS.publish(upload_id, {
+            **failure,
+            "updatedAt": datetime.utcnow().isoformat(),
+        }, force=True)
+
     finally:
+        if report:
+            report.close()
         session.close()
+
+
+
+@contextmanager
+def store_upload_lock(store_id: str):
+    """
+    Postgres session-level advisory lock serializing upload jobs of one
+    store across worker processes. Held on its own autocommit connection
+    so the job's chunk commits do not release it. Taken without waiting,
+    so a scheduler thread is never parked on another process's upload;
+    yields whether it was acquired.
+
+    Other databases (SQLite for tests and the benchmark) have no advisory
+    locks; there a single process runs the uploads and UPLOAD_SCHEDULER
+    alone serializes a store's jobs.
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        params = {"key": f"upload:{store_id}"}
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), params).scalar()
         try:
-            os.remove(file_path)
-        except Exception:
-            pass
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), params)
+
+
+def run_upload_job(
+    upload_id: str,
+    store_id: str,
+    supplier_id: Optional[str],
+    file_path: str
+):
+    """
+    Entry point for UPLOAD_SCHEDULER: runs an upload under its store's lock.
+    If another worker process holds the lock, the job stays PENDING and is
+    scheduled again after UPLOAD_LOCK_RETRY_SECONDS.
+    """
+    with store_upload_lock(store_id) as acquired:
+        if acquired:
+            process_supplier_medicine_upload(upload_id, store_id, supplier_id, file_path)
+            return
 
+    logger.info(f"Store {store_id} is locked by another worker, upload {upload_id} retries later")
+    retry = threading.Timer(
+        UPLOAD_LOCK_RETRY_SECONDS,
+        schedule_upload,
+        args=(upload_id, store_id, supplier_id, file_path),
+    )
+    retry.daemon = True
+    retry.start()
+
+
+def schedule_upload(
+    upload_id: str,
+    store_id: str,
+    supplier_id: Optional[str],
+    file_path: str
+) -> bool:
+    """Queues an upload job; returns True if it waits behind another upload for the store."""
+    return UPLOAD_SCHEDULER.submit(store_id, run_upload_job, upload_id, store_id, supplier_id, file_path)
 
 
 def get_daily_sales_df(session: Session, store_id: str, medicine_id: str) -> pd.DataFrame:
@@ -1882,6 +2931,11 @@ def get_inventory_snapshot(session, store_id, medicine_id):
         .all()
     )
 
+    return summarize_batches(batches)
+
+
+def summarize_batches(batches) -> tuple[int, dict]:
+    """Stock on hand and per-batch expiry info from InventoryBatch rows of one medicine."""
     current_stock = sum(b.qtyAvailable for b in batches)
 
     expiry_map = {}
@@ -1896,130 +2950,6 @@ def get_inventory_snapshot(session, store_id, medicine_id):
     return current_stock, expiry_map
 
 
-def prophet_forecast_series(df: pd.DataFrame, days: int):
-    model = Prophet(
-        weekly_seasonality=True,
-        yearly_seasonality=True,
-        daily_seasonality=False,
-    )
-    model.fit(df)
-
-    future = model.make_future_dataframe(periods=days)
-    forecast = model.predict(future)
-
-    return forecast
-
-
-def build_plot_data(df: pd.DataFrame, forecast: pd.DataFrame, history_cutoff: pd.Timestamp):
-    history = [
-        {"date": d.strftime("%Y-%m-%d"), "qty": int(y)}
-        for d, y in zip(df["ds"], df["y"])
-    ]
-
-    future = forecast[forecast["ds"] > history_cutoff]
-
-    forecast_points = [
-        {
-            "date": row.ds.strftime("%Y-%m-%d"),
-            "qty": int(max(0, row.yhat)),
-        }
-        for _, row in future.iterrows()
-    ]
-
-    confidence = [
-        {
-            "date": row.ds.strftime("%Y-%m-%d"),
-            "low": int(max(0, row.yhat_lower)),
-            "high": int(max(0, row.yhat_upper)),
-        }
-        for _, row in future.iterrows()
-    ]
-
-    return {
-        "history": history,
-        "forecast": forecast_points,
-        "confidence": confidence,
-        "cutoff_date": history_cutoff.strftime("%Y-%m-%d"),
-    }
-
-
-def detect_price_surge(price_df: pd.DataFrame):
-    if len(price_df) < 8:
-        return None
-
-    prices = price_df["y"].tolist()
-
-    baseline = mean(prices[-8:-4])
-    recent = mean(prices[-4:])
-
-    if baseline <= 0:
-        return None
-
-    pct = ((recent - baseline) / baseline) * 100
-
-    if pct < 15:
-        return None
-
-    if pct >= 50:
-        level = "CRITICAL"
-    elif pct >= 30:
-        level = "HIGH"
-    else:
-        level = "MEDIUM"
-
-    return {
-        "risk_level": level,
-        "expected_increase_pct": round(pct, 2),
-        "baseline_price": round(baseline, 2),
-        "recent_price": round(recent, 2),
-        "recommendation": "Stock up before supplier price hike",
-    }
-
-
-def build_price_plot_data(price_df: pd.DataFrame):
-    return {
-        "history": [
-            {"date": d.strftime("%Y-%m-%d"), "qty": round(p, 2)}
-            for d, p in zip(price_df["ds"], price_df["y"])
-        ],
-        "cutoff_date": price_df["ds"].max().strftime("%Y-%m-%d"),
-    }
-
-
-def project_price_series(price_df: pd.DataFrame, horizon_days: int):
-    if len(price_df) < 5:
-        return [], []
-
-    last_price = price_df["y"].iloc[-1]
-
-    # simple slope from last N points
-    recent = price_df.tail(5)
-    slope = (recent["y"].iloc[-1] - recent["y"].iloc[0]) / max(len(recent), 1)
-
-    forecast = []
-    confidence = []
-
-    start_date = price_df["ds"].max()
-
-    for i in range(1, horizon_days + 1):
-        projected = max(0, last_price + slope * i)
-
-        date = start_date + timedelta(days=i)
-
-        forecast.append({
-            "date": date.date().isoformat(),
-            "qty": round(projected, 2),
-        })
-
-        confidence.append({
-            "date": date.date().isoformat(),
-            "low": round(projected * 0.95, 2),
-            "high": round(projected * 1.05, 2),
-        })
-
-    return forecast, confidence
-
-
 @app.post("/chat", response_model=ChatResponse, tags=["Chatbot"])
 async def chat(body: ChatRequest, request: Request):
     user_ctx = request.state.user  
@@ -2087,53 +3017,363 @@ def download_supplier_upload_template():
 class UploadResponse(BaseModel):
     upload_id: str
     message: str
+    duplicate: bool = False
+    preview: Optional[Dict] = None
 
-@app.post("/supplier/upload", response_model=UploadResponse, tags=["Supplier"])
-def supplier_upload(
-    background_tasks: BackgroundTasks,
-    store_slug: str = Query(..., description="Store slug (e.g. my-pharmacy-1)"),
-    supplier_id: Optional[str] = Query(None, description="Supplier id (UUID) or supplier legacy id"),
-    file: UploadFile = File(...),
-):
-    # resolve store
-    db: Session = SessionLocal()
+async def stream_upload_to_disk(file: UploadFile, file_path: str) -> str:
+    """
+    Streams an uploaded file to disk chunk by chunk, enforcing
+    UPLOAD_MAX_BYTES, and returns the xxh3-128 digest of its content.
+
+    The request body as a whole is already capped while it is received
+    (UploadSizeLimitMiddleware); this applies the exact limit to the file.
+    """
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"File exceeds the {UPLOAD_MAX_BYTES // (1024 * 1024)} MB upload limit",
+    )
+    if file.size is not None and file.size > UPLOAD_MAX_BYTES:
+        raise too_large
+
+    hasher = xxhash.xxh3_128()
+    size = 0
+    try:
+        async with aiofiles.open(file_path, "wb") as out:
+            while chunk := await file.read(UPLOAD_READ_CHUNK_BYTES):
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise too_large
+                hasher.update(chunk)
+                await out.write(chunk)
+    except BaseException:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        raise
+
+    return hasher.hexdigest()
+
+
+def get_store_id_by_slug(store_slug: str) -> str | None:
+    db = SessionLocal()
     try:
         store = db.query(Store).filter(Store.slug == store_slug).one_or_none()
-        if not store:
-            raise HTTPException(status_code=404, detail="Store not found")
-        store_id = store.id
-
-        # save file to disk
-        file_bytes = file.file.read()
-        upload_filename = f"{uuid.uuid4()}_{file.filename}"
-        file_path = str(UPLOAD_STORE / upload_filename)
-        with open(file_path, "wb") as f:
-            f.write(file_bytes)
-
-        # create Upload row
+        return store.id if store else None
+    finally:
+        db.close()
+
+
+def create_upload_record(
+    *,
+    store_id: str,
+    supplier_id: Optional[str],
+    filename: Optional[str],
+    file_path: str,
+    content_hash: str,
+    metadata: Optional[Dict] = None,
+) -> tuple[str, bool]:
+    """
+    Creates the PENDING Upload row, unless the same file was already
+    received for this store. Returns (upload_id, is_duplicate).
+    """
+    db = SessionLocal()
+    try:
+        original = find_duplicate_upload(db, store_id, content_hash)
+        if original:
+            return original.id, True
+
         upload = Upload(
             id=new_uuid(),
             storeId=store_id,
-            filename=file.filename,
+            filename=filename,
             status="PENDING",
+            contentHash=content_hash,
             metadata_json={
-                "original_filename": file.filename,
-                "uploaded_by_supplier": supplier_id
+                "original_filename": filename,
+                "uploaded_by_supplier": supplier_id,
+                "filePath": file_path,
+                **(metadata or {}),
             }
         )
         db.add(upload)
         db.commit()
+        return upload.id, False
+    finally:
+        db.close()
 
-        # schedule background processing
-        background_tasks.add_task(process_supplier_medicine_upload, upload.id, store_id, supplier_id, file_path)
 
-        return UploadResponse(upload_id=upload.id, message="Upload accepted and processing started.")
+@app.post("/supplier/upload", response_model=UploadResponse, tags=["Supplier"])
+async def supplier_upload(
+    store_slug: str = Query(..., description="Store slug (e.g. my-pharmacy-1)"),
+    supplier_id: Optional[str] = Query(None, description="Supplier id (UUID) or supplier legacy id"),
+    mode: Literal["apply", "preview"] = Query("apply", description="preview validates the file without touching inventory"),
+    file: UploadFile = File(...),
+):
+    # resolve store
+    store_id = await run_in_threadpool(get_store_id_by_slug, store_slug)
+    if not store_id:
+        raise HTTPException(status_code=404, detail="Store not found")
+
+    # stream file to disk, hashing as we go
+    upload_filename = f"{uuid.uuid4()}_{Path(file.filename or 'upload.xlsx').name}"
+    file_path = str(UPLOAD_STORE / upload_filename)
+    content_hash = await stream_upload_to_disk(file, file_path)
+
+    upload_id, duplicate = await run_in_threadpool(
+        lambda: create_upload_record(
+            store_id=store_id,
+            supplier_id=supplier_id,
+            filename=file.filename,
+            file_path=file_path,
+            content_hash=content_hash,
+        )
+    )
+
+    # same file already received for this store: point at the original upload
+    if duplicate:
+        os.remove(file_path)
+        return UploadResponse(
+            upload_id=upload_id,
+            message="Duplicate of an earlier upload for this store; no processing started.",
+            duplicate=True,
+        )
+
+    if mode == "preview":
+        try:
+            preview = await run_in_threadpool(preview_supplier_upload, upload_id, store_id, file_path)
+        except Exception as e:
+            # a failed preview is never applied; anything left PENDING would sit there for good
+            await run_in_threadpool(mark_upload_failed, upload_id, str(e))
+            remove_upload_files(file_path, parsed_frame_path(upload_id), rejected_report_path(upload_id))
+            if isinstance(e, ValueError):
+                raise HTTPException(status_code=422, detail=str(e))
+            logger.exception("Preview of upload %s failed", upload_id)
+            raise HTTPException(status_code=500, detail="Preview failed")
+
+        return UploadResponse(
+            upload_id=upload_id,
+            message="Preview ready. Apply the upload to add it to inventory.",
+            preview=preview,
+        )
+
+    # schedule background processing
+    if schedule_upload(upload_id, store_id, supplier_id, file_path):
+        return UploadResponse(upload_id=upload_id, message="Upload accepted and queued behind another upload for this store.")
+
+    return UploadResponse(upload_id=upload_id, message="Upload accepted and processing started.")
+
+
+class FanoutStoreUpload(BaseModel):
+    store_slug: str
+    upload_id: str
+    duplicate: bool = False
+    queued: bool = False
+
+
+class FanoutUploadResponse(BaseModel):
+    message: str
+    summary: Dict
+    uploads: List[FanoutStoreUpload]
+
+
+def resolve_fanout_stores(
+    store_slugs: Optional[List[str]],
+    supplier_id: Optional[str],
+    all_linked_stores: bool,
+) -> tuple[List[tuple[str, str]], List[str]]:
+    """
+    Target stores of a fan-out upload as (store_id, slug) pairs, plus the
+    requested slugs that do not exist.
+    """
+    db = SessionLocal()
+    try:
+        if all_linked_stores:
+            rows = (
+                db.query(Store.id, Store.slug)
+                .join(SupplierStore, SupplierStore.storeId == Store.id)
+                .filter(SupplierStore.supplierId == supplier_id, Store.isActive.is_(True))
+                .distinct()
+                .all()
+            )
+            return [(store_id, slug) for store_id, slug in rows], []
+
+        slugs = list(dict.fromkeys(store_slugs))
+        rows = db.query(Store.id, Store.slug).filter(Store.slug.in_(slugs)).all()
+        found = {slug: store_id for store_id, slug in rows}
+        return (
+            [(found[slug], slug) for slug in slugs if slug in found],
+            [slug for slug in slugs if slug not in found],
+        )
     finally:
         db.close()
 
 
-@app.get("/supplier/upload/{upload_id}/status", tags=["Supplier"])
-def upload_status(upload_id: str):
+def prepare_fanout_upload(fanout_id: str, file_path: str) -> dict:
+    """
+    Parses and validates a fan-out file once. The valid rows and the
+    rejected-rows report are written next to the file for every store's
+    upload to start from. Raises ValueError when expected columns are missing.
+    """
+    df = load_upload_frame(file_path)
+    total_rows = len(df)
+    valid, rejected = clean_upload_frame(df)
+
+    parsed_path = parsed_frame_path(fanout_id)
+    valid.to_parquet(parsed_path)
+
+    rejected_path = rejected_report_path(fanout_id)
+    with RejectedRowsReport(rejected_path, EXPECTED_COLUMNS, truncate=True) as report:
+        report.write_frame(rejected)
+        rejected_bytes = report.flush()
+
+    return {
+        "parsedPath": parsed_path,
+        "rejectedPath": rejected_path,
+        "totalRows": total_rows,
+        "validRows": len(valid),
+        "rejectedRows": len(rejected),
+        "rejectedBytes": rejected_bytes,
+    }
+
+
+def link_or_copy(src: str, dst: str):
+    """Hard-links dst to src (no extra disk space), copying where links are not supported."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def create_fanout_uploads(
+    *,
+    fanout_id: str,
+    stores: List[tuple[str, str]],
+    supplier_id: Optional[str],
+    filename: Optional[str],
+    file_path: str,
+    content_hash: str,
+    prepared: dict,
+) -> List[FanoutStoreUpload]:
+    """
+    Creates one Upload per target store, sharing the parsed frame of the
+    fan-out, and schedules them. Each upload gets its own links to the
+    source file and parsed frame, since a finished job removes its files,
+    and its own copy of the rejected-rows report, which it appends to.
+    """
+    results = []
+    for store_id, slug in stores:
+        store_file_path = str(UPLOAD_STORE / f"{uuid.uuid4()}_{Path(filename or 'upload.xlsx').name}")
+        store_parsed_path = parsed_frame_path(f"{fanout_id}.{store_id}")
+        store_rejected_path = str(UPLOAD_STORE / f"{fanout_id}.{store_id}.rejected.csv")
+
+        link_or_copy(file_path, store_file_path)
+        link_or_copy(prepared["parsedPath"], store_parsed_path)
+        shutil.copyfile(prepared["rejectedPath"], store_rejected_path)
+
+        upload_id, duplicate = create_upload_record(
+            store_id=store_id,
+            supplier_id=supplier_id,
+            filename=filename,
+            file_path=store_file_path,
+            content_hash=content_hash,
+            metadata={
+                "fanoutId": fanout_id,
+                "parsedPath": store_parsed_path,
+                "rejectedPath": store_rejected_path,
+                "rejectedRows": prepared["rejectedRows"],
+                "rejectedBytes": prepared["rejectedBytes"],
+            },
+        )
+
+        if duplicate:
+            for path in (store_file_path, store_parsed_path, store_rejected_path):
+                os.remove(path)
+            results.append(FanoutStoreUpload(store_slug=slug, upload_id=upload_id, duplicate=True))
+            continue
+
+        queued = schedule_upload(upload_id, store_id, supplier_id, store_file_path)
+        results.append(FanoutStoreUpload(store_slug=slug, upload_id=upload_id, queued=queued))
+
+    return results
+
+
+@app.post("/supplier/upload/fanout", response_model=FanoutUploadResponse, tags=["Supplier"])
+async def supplier_upload_fanout(
+    store_slugs: Optional[List[str]] = Query(None, description="Store slugs to apply the file to"),
+    all_linked_stores: bool = Query(False, description="Apply the file to every active store linked to the supplier"),
+    supplier_id: Optional[str] = Query(None, description="Supplier id (UUID) or supplier legacy id"),
+    file: UploadFile = File(...),
+):
+    """
+    Applies one supplier file to several stores. The file is parsed and
+    validated once; every store gets its own upload, processed in
+    parallel with the others and tracked through the usual status and
+    events endpoints.
+    """
+    if bool(store_slugs) == all_linked_stores:
+        raise HTTPException(status_code=422, detail="Pass either store_slugs or all_linked_stores=true")
+    if all_linked_stores and not supplier_id:
+        raise HTTPException(status_code=422, detail="supplier_id is required with all_linked_stores")
+
+    stores, unknown = await run_in_threadpool(resolve_fanout_stores, store_slugs, supplier_id, all_linked_stores)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Stores not found: {', '.join(unknown)}")
+    if not stores:
+        raise HTTPException(status_code=404, detail="Supplier is not linked to any active store")
+
+    fanout_id = new_uuid()
+    file_path = str(UPLOAD_STORE / f"{fanout_id}_{Path(file.filename or 'upload.xlsx').name}")
+    content_hash = await stream_upload_to_disk(file, file_path)
+
+    try:
+        try:
+            prepared = await run_in_threadpool(prepare_fanout_upload, fanout_id, file_path)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+
+        uploads = await run_in_threadpool(
+            lambda: create_fanout_uploads(
+                fanout_id=fanout_id,
+                stores=stores,
+                supplier_id=supplier_id,
+                filename=file.filename,
+                file_path=file_path,
+                content_hash=content_hash,
+                prepared=prepared,
+            )
+        )
+    finally:
+        # every store upload holds its own links and copies by now
+        remove_upload_files(file_path, parsed_frame_path(fanout_id), rejected_report_path(fanout_id))
+
+    summary = {k: prepared[k] for k in ("totalRows", "validRows", "rejectedRows")}
+    started = sum(1 for u in uploads if not u.duplicate)
+    return FanoutUploadResponse(
+        message=f"Upload accepted for {started} of {len(uploads)} stores.",
+        summary=summary,
+        uploads=uploads,
+    )
+
+
+def mark_upload_failed(upload_id: str, reason: str):
+    db = SessionLocal()
+    try:
+        upload = db.query(Upload).get(upload_id)
+        if upload:
+            upload.status = "FAILED"
+            upload.metadata_json = {
+                **(upload.metadata_json or {}),
+                "phase": "FAILED",
+                "messages": [reason],
+            }
+            db.commit()
+    finally:
+        db.close()
+
+
+@app.post("/supplier/upload/{upload_id}/apply", response_model=UploadResponse, tags=["Supplier"])
+def apply_upload(upload_id: str):
     db = SessionLocal()
     try:
         upload = db.query(Upload).get(upload_id)
@@ -2141,301 +3381,750 @@ def upload_status(upload_id: str):
             raise HTTPException(404, "Upload not found")
 
         meta = upload.metadata_json or {}
+        parsed_path = meta.get("parsedPath")
+        if upload.status != "PREVIEW_READY" or not parsed_path:
+            raise HTTPException(409, "Upload has no pending preview to apply")
+        if not os.path.exists(parsed_path):
+            raise HTTPException(410, "Preview is no longer available, please upload again")
+
+        upload.status = "PENDING"
+        upload.metadata_json = {**meta, "phase": "PENDING"}
+        db.commit()
+        UPLOAD_PROGRESS.discard(upload.id)
+
+        schedule_upload(
+            upload.id,
+            upload.storeId,
+            meta.get("uploaded_by_supplier"),
+            meta.get("filePath"),
+        )
+
+        return UploadResponse(upload_id=upload.id, message="Preview applied and processing started.")
+    finally:
+        db.close()
+
+
+def format_upload_status(upload_id: str, progress: dict) -> dict:
+    return {
+        "uploadId": upload_id,
+        "status": progress.get("status", "PENDING"),
+        "progressPercent": progress.get("progressPercent", 0),
+        "processedRows": progress.get("processedRows", 0),
+        "insertedRows": progress.get("insertedRows", 0),
+        "totalRows": progress.get("totalRows", 0),
+        "errorRows": progress.get("errorRows", 0),
+        "rejectedRows": progress.get("rejectedRows", 0),
+        "phase": progress.get("phase", "PENDING"),
+        "createdAt": progress.get("createdAt"),
+        "updatedAt": progress.get("updatedAt")
+    }
+
+
+def load_upload_progress(upload_id: str) -> dict | None:
+    """Progress as persisted on the Upload row, or None if it does not exist."""
+    db = SessionLocal()
+    try:
+        upload = db.query(Upload).get(upload_id)
+        if not upload:
+            return None
 
         return {
-            "uploadId": upload.id,
+            **(upload.metadata_json or {}),
             "status": upload.status,
-            "progressPercent": meta.get("progressPercent", 0),
-            "processedRows": meta.get("processedRows", 0),
-            "totalRows": meta.get("totalRows", 0),
-            "errorRows": meta.get("errorRows", 0),
-            "phase": meta.get("phase", "PENDING"),
             "createdAt": upload.createdAt.isoformat(),
-            "updatedAt": upload.updatedAt.isoformat()
+            "updatedAt": upload.updatedAt.isoformat(),
         }
     finally:
         db.close()
 
 
-# @app.post("/forecast/inventory", response_model=ForecastResponse, tags=["Forecasting"])
-# def forecast_inventory(req: ForecastRequest):
-#     session = SessionLocal()
-
-#     try:
-#         # 1. Validate medicine
-#         medicine = session.get(Medicine, req.medicine_id)
-#         if not medicine:
-#             raise HTTPException(404, "Medicine not found")
-
-#         medicine_name = decrypt_cell(medicine.brandName)
-
-#         # 2. Demand time series (sales)
-#         sales_df = get_daily_sales_df(
-#             session, req.store_id, req.medicine_id
-#         )
-#         print(f"length of the sales_df: {len(sales_df)}")
-#         if len(sales_df) < 14:
-#             raise HTTPException(400, "Not enough sales data for demand forecasting")
-
-#         # 3. Price time series (MRP)
-#         price_df = get_daily_price_df(
-#             session, req.store_id, req.medicine_id
-#         )
-#         if len(price_df) < 10:
-#             raise HTTPException(400, "Not enough price history for price forecasting")
-
-#         # 4. Inventory snapshot
-#         current_stock, expiry_map = get_inventory_snapshot(
-#             session, req.store_id, req.medicine_id
-#         )
-
-#         # 5. Unified horizon
-#         max_horizon = max(req.horizon_days)
-
-#         # 6. Demand forecast
-#         demand_forecast_df = prophet_forecast_series(
-#             sales_df, max_horizon
-#         )
-#         demand_cutoff = sales_df["ds"].max()
-
-#         demand_forecast = {}
-#         reorder_quantity = {}
-#         SAFETY_STOCK = 10
-
-#         for h in req.horizon_days:
-#             slice_df = demand_forecast_df.tail(h)
-#             expected = int(slice_df["yhat"].clip(lower=0).sum())
-
-#             demand_forecast[str(h)] = expected
-#             reorder_quantity[str(h)] = max(
-#                 0, expected + SAFETY_STOCK - current_stock
-#             )
-
-#         reorder_now = reorder_quantity[str(min(req.horizon_days))] > 0
-
-#         # 7. Price forecast (SAME FLOW AS DEMAND)
-#         price_forecast_df = prophet_forecast_series(
-#             price_df, max_horizon
-#         )
-#         price_cutoff = price_df["ds"].max()
-
-#         # 8. Price surge detection (derived insight)
-#         baseline_price = price_df["y"].tail(7).mean()
-#         future_price = price_forecast_df.tail(7)["yhat"].mean()
-
-#         price_surge_risk = None
-#         pct_change = ((future_price - baseline_price) / baseline_price) * 100
-
-#         if pct_change >= 15:
-#             price_surge_risk = PriceSurgeRisk(
-#                 risk_level="HIGH",
-#                 expected_increase_pct=round(pct_change, 2),
-#                 recommendation="Stock up immediately before supplier price hike",
-#                 baseline_price=round(baseline_price, 2),
-#                 recent_price=round(future_price, 2),
-#             )
-#         elif pct_change >= 7:
-#             price_surge_risk = PriceSurgeRisk(
-#                 risk_level="MEDIUM",
-#                 expected_increase_pct=round(pct_change, 2),
-#                 recommendation="Consider early procurement to protect margins",
-#                 baseline_price=round(baseline_price, 2),
-#                 recent_price=round(future_price, 2),
-#             )
-
-#         # 9. Expiry & waste estimation
-#         expiry_risk = {}
-#         estimated_waste_units = 0
-#         demand_30d = demand_forecast.get("30", 0)
-
-#         for batch_id, info in expiry_map.items():
-#             if info["days_to_expiry"] <= 30:
-#                 expiry_risk[batch_id] = info["qty"]
-#                 if info["qty"] > demand_30d:
-#                     estimated_waste_units += info["qty"] - demand_30d
-
-#         # 10. Plot-ready data (CLEAN & SYMMETRIC)
-#         demand_plot = build_plot_data(
-#             sales_df, demand_forecast_df, demand_cutoff
-#         )
-
-#         price_plot = build_plot_data(
-#             price_df, price_forecast_df, price_cutoff
-#         )
-
-#         # 11. Response (FINAL CONTRACT)
-#         return ForecastResponse(
-#             medicine_name=medicine_name,
-#             current_stock=current_stock,
-
-#             demand_forecast=demand_forecast,
-#             reorder_quantity=reorder_quantity,
-#             reorder_now=reorder_now,
-
-#             expiry_risk=expiry_risk,
-#             estimated_waste_units=estimated_waste_units,
-
-#             plot_data={
-#                 "demand": demand_plot,
-#                 "price": price_plot,
-#             },
-
-#             price_surge_risk=price_surge_risk,
-#             price_plot_data=price_plot,  # optional duplicate for UI convenience
-#         )
-
-#     finally:
-#         session.close()
+@app.get("/supplier/upload/{upload_id}/status", tags=["Supplier"])
+def upload_status(upload_id: str):
+    # Jobs running in this process publish live progress, no DB round trip needed
+    progress = UPLOAD_PROGRESS.get(upload_id) or load_upload_progress(upload_id)
+    if not progress:
+        raise HTTPException(404, "Upload not found")
 
+    return format_upload_status(upload_id, progress)
 
-@app.post("/forecast/inventory", response_model=ForecastResponse, tags=["Forecasting"])
-def forecast_inventory(req: ForecastRequest):
-    session = SessionLocal()
 
+@app.get("/supplier/upload/{upload_id}/rejected", tags=["Supplier"])
+def download_rejected_rows(upload_id: str):
+    """CSV of every row the upload rejected or failed to ingest, with the reason."""
+    db = SessionLocal()
     try:
-        # Validate medicine
-        medicine = session.get(Medicine, req.medicine_id)
-        if not medicine:
-            raise HTTPException(404, "Medicine not found")
+        upload = db.query(Upload).get(upload_id)
+        if not upload:
+            raise HTTPException(404, "Upload not found")
 
-        medicine_name = decrypt_cell(medicine.brandName)
+        meta = upload.metadata_json or {}
+        rejected_path = meta.get("rejectedPath")
+        if not rejected_path or not os.path.exists(rejected_path):
+            raise HTTPException(404, "No rejected rows report for this upload")
 
-        # Demand time series (sales)
-        sales_df = get_daily_sales_df(
-            session, req.store_id, req.medicine_id
-        )
+        filename = f"{Path(upload.filename or 'upload').stem}-rejected.csv"
+        return FileResponse(path=rejected_path, media_type="text/csv", filename=filename)
+    finally:
+        db.close()
 
-        if len(sales_df) < 14:
-            raise HTTPException(
-                400, "Not enough sales data for demand forecasting"
-            )
 
-        # Price time series (MRP history)
-        price_df = get_daily_price_df(
-            session, req.store_id, req.medicine_id
+@app.get("/supplier/upload/{upload_id}/events", tags=["Supplier"])
+async def upload_events(upload_id: str, request: Request):
+    """
+    Server-sent events with the upload's progress. A `progress` event is
+    pushed whenever the job publishes, and the stream closes once the
+    upload completes, fails, or is waiting on a preview to be applied.
+    """
+    queue = UPLOAD_PROGRESS.subscribe(upload_id)
+
+    progress = UPLOAD_PROGRESS.get(upload_id) or await run_in_threadpool(load_upload_progress, upload_id)
+    if not progress:
+        UPLOAD_PROGRESS.unsubscribe(upload_id, queue)
+        raise HTTPException(404, "Upload not found")
+
+    async def event_stream(progress: dict):
+        try:
+            while True:
+                payload = format_upload_status(upload_id, progress)
+                yield {"event": "progress", "data": json.dumps(payload)}
+
+                if payload["phase"] in ("COMPLETED", "FAILED", "PREVIEW_READY"):
+                    return
+                if await request.is_disconnected():
+                    return
+
+                try:
+                    progress = await asyncio.wait_for(queue.get(), timeout=UPLOAD_EVENTS_FALLBACK_SECONDS)
+                except asyncio.TimeoutError:
+                    # Quiet for a while: the job may be queued or running in another worker
+                    progress = (
+                        UPLOAD_PROGRESS.get(upload_id)
+                        or await run_in_threadpool(load_upload_progress, upload_id)
+                        or progress
+                    )
+        finally:
+            UPLOAD_PROGRESS.unsubscribe(upload_id, queue)
+
+    return EventSourceResponse(event_stream(progress))
+
+
+@app.post("/supplier/upload/{upload_id}/resume", response_model=UploadResponse, tags=["Supplier"])
+def resume_upload(upload_id: str):
+    db = SessionLocal()
+    try:
+        upload = db.query(Upload).get(upload_id)
+        if not upload:
+            raise HTTPException(404, "Upload not found")
+
+        # Only failed runs are resumed. A PROCESSING row whose chunks stopped
+        # refreshing updatedAt belongs to a worker that died, so it counts as
+        # failed; PENDING, running and finished uploads must not run twice.
+        stale_before = datetime.utcnow() - timedelta(seconds=UPLOAD_STALE_SECONDS)
+        interrupted = upload.status == "PROCESSING" and upload.updatedAt <= stale_before
+        if upload.status != "FAILED" and not interrupted:
+            raise HTTPException(409, f"Upload is {upload.status}, only failed uploads can be resumed")
+
+        meta = upload.metadata_json or {}
+        file_path = meta.get("filePath")
+        if not file_path or not os.path.exists(file_path):
+            raise HTTPException(410, "Upload file is no longer available, please upload again")
+
+        # PENDING before the job is queued, so a progress stream opened
+        # right after this call does not read the old FAILED row and close
+        upload.status = "PENDING"
+        upload.metadata_json = {**meta, "phase": "PENDING"}
+        db.commit()
+        UPLOAD_PROGRESS.discard(upload.id)
+        schedule_upload(
+            upload.id,
+            upload.storeId,
+            meta.get("uploaded_by_supplier"),
+            file_path,
         )
 
-        if len(price_df) < 5:
-            raise HTTPException(
-                400, "Not enough price history for price forecasting"
-            )
+        next_row = meta.get("lastCommittedRow", -1) + 1
+        return UploadResponse(upload_id=upload.id, message=f"Upload resumed from row {next_row}.")
+    finally:
+        db.close()
+
 
-        # Inventory snapshot
-        current_stock, expiry_map = get_inventory_snapshot(
-            session, req.store_id, req.medicine_id
+def forecast_watermark(session: Session, store_id: str, medicine_id: str) -> tuple:
+    """
+    Identifies the state of the data a forecast is computed from: the
+    latest stock movement and movement count, the latest batch change,
+    batch count and stock on hand, and today's date (days to expiry
+    depend on it). One round trip.
+    """
+    def of_medicine(model, *columns):
+        return (
+            select(*columns)
+            .where(model.storeId == store_id, model.medicineId == medicine_id)
+            .scalar_subquery()
         )
 
-        # Unified horizon
-        max_horizon = max(req.horizon_days)
+    row = session.query(
+        of_medicine(StockMovement, func.max(StockMovement.createdAt)),
+        of_medicine(StockMovement, func.count(StockMovement.id)),
+        of_medicine(InventoryBatch, func.max(InventoryBatch.updatedAt)),
+        of_medicine(InventoryBatch, func.count(InventoryBatch.id)),
+        of_medicine(InventoryBatch, func.sum(InventoryBatch.qtyAvailable)),
+    ).one()
+    return (*row, datetime.utcnow().date())
+
 
-       
-        # DEMAND FORECAST (Prophet)
-        demand_forecast_df = prophet_forecast_series(
-            sales_df, max_horizon
+@app.post("/forecast/inventory", response_model=ForecastResponse, tags=["Forecasting"])
+async def forecast_inventory(req: ForecastRequest):
+    # Reads run on the threadpool, model fits on the forecast process pool
+    if req.mode == "precomputed":
+        return await run_in_threadpool(serve_precomputed_forecast, req)
+
+    cached, inputs, watermark = await run_in_threadpool(prepare_inventory_forecast, req)
+    if cached:
+        return cached
+
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            FORECAST_POOL, partial(forecast_medicine, **inputs, horizon_days=req.horizon_days)
         )
-        demand_cutoff = sales_df["ds"].max()
+    except InsufficientHistoryError as e:
+        raise HTTPException(400, str(e))
 
-        demand_forecast = {}
-        reorder_quantity = {}
-        SAFETY_STOCK = 10
+    response = await run_in_threadpool(forecast_response, req.store_id, req.medicine_id, result)
+    FORECAST_CACHE.put(forecast_cache_key(req), watermark, response)
+    return response
 
-        for h in req.horizon_days:
-            slice_df = demand_forecast_df.tail(h)
-            expected = int(slice_df["yhat"].clip(lower=0).sum())
 
-            demand_forecast[str(h)] = expected
-            reorder_quantity[str(h)] = max(
-                0, expected + SAFETY_STOCK - current_stock
-            )
+def forecast_cache_key(req: ForecastRequest) -> tuple:
+    return (req.store_id, req.medicine_id, tuple(req.horizon_days))
 
-        reorder_now = reorder_quantity[str(min(req.horizon_days))] > 0
 
-      
-        # PRICE FORECAST (DETERMINISTIC — NOT PROPHET)
-        price_forecast, price_confidence = project_price_series(
-            price_df, max_horizon
+def prepare_inventory_forecast(req: ForecastRequest) -> tuple[Optional[ForecastResponse], dict, tuple]:
+    """
+    Returns (cached response, None, watermark) when the data did not change
+    since the last fit, else (None, forecast_medicine inputs, watermark).
+    """
+    if not req.horizon_days:
+        raise HTTPException(400, "horizon_days must not be empty")
+
+    session = SessionLocal()
+    try:
+        # Refit only when sales or batches changed since the cached forecast
+        watermark = forecast_watermark(session, req.store_id, req.medicine_id)
+        cached = FORECAST_CACHE.get(forecast_cache_key(req), watermark)
+        if cached:
+            return cached, None, watermark
+        return None, load_inventory_forecast_inputs(session, req), watermark
+    finally:
+        session.close()
+
+
+def load_inventory_forecast_inputs(session: Session, req: ForecastRequest) -> dict:
+    """Series and inventory snapshot of one medicine, as forecast_medicine takes them."""
+    # Validate medicine
+    medicine = session.get(Medicine, req.medicine_id)
+    if not medicine:
+        raise HTTPException(404, "Medicine not found")
+
+    current_stock, expiry_map = get_inventory_snapshot(
+        session, req.store_id, req.medicine_id
+    )
+
+    return {
+        "medicine_name": decrypt_cell(medicine.brandName),
+        "sales_df": get_daily_sales_df(session, req.store_id, req.medicine_id),
+        "price_df": get_daily_price_df(session, req.store_id, req.medicine_id),
+        "current_stock": current_stock,
+        "expiry_map": expiry_map,
+        "prophet_model": load_prophet_models(session, req.store_id, [req.medicine_id]).get(req.medicine_id),
+    }
+
+
+def load_prophet_models(session: Session, store_id: str, medicine_ids: list[str] | None = None) -> dict[str, dict]:
+    """Persisted Prophet fits of a store (or of some of its medicines), keyed by medicine id."""
+    rows = session.query(ForecastModel.medicineId, ForecastModel.trainingWatermark, ForecastModel.modelJson).filter(
+        ForecastModel.storeId == store_id
+    )
+    if medicine_ids is not None:
+        rows = rows.filter(ForecastModel.medicineId.in_(medicine_ids))
+    return {r.medicineId: {"watermark": r.trainingWatermark, "model": r.modelJson} for r in rows}
+
+
+def save_prophet_model(session: Session, store_id: str, medicine_id: str, fit: dict):
+    stmt = dialect_insert(ForecastModel).values(
+        id=new_uuid(),
+        storeId=store_id,
+        medicineId=medicine_id,
+        trainingWatermark=fit["watermark"],
+        modelJson=fit["model"],
+    )
+    session.execute(stmt.on_conflict_do_update(
+        index_elements=["storeId", "medicineId"],
+        set_={
+            "trainingWatermark": stmt.excluded.trainingWatermark,
+            "modelJson": stmt.excluded.modelJson,
+            "updatedAt": func.now(),
+        },
+    ))
+
+
+def forecast_response(store_id: str, medicine_id: str, result: dict) -> ForecastResponse:
+    """
+    Builds the response from forecast_medicine's result and persists the
+    new Prophet fit it carries, if any, for the next forecast to reuse.
+    """
+    result = dict(result)
+    fit = result.pop("prophet_model", None)
+    if fit:
+        session = SessionLocal()
+        try:
+            save_prophet_model(session, store_id, medicine_id, fit)
+            session.commit()
+        except Exception:
+            # the forecast is still good; the next one just fits from scratch
+            session.rollback()
+            logger.exception(f"Could not persist Prophet model for medicine {medicine_id}")
+        finally:
+            session.close()
+    return ForecastResponse(**result)
+
+
+def serve_precomputed_forecast(req: ForecastRequest) -> ForecastResponse:
+    session = SessionLocal()
+    try:
+        return read_precomputed_forecast(session, req)
+    finally:
+        session.close()
+
+
+def read_precomputed_forecast(session: Session, req: ForecastRequest) -> ForecastResponse:
+    """Serves the nightly forecast of one medicine, trimmed to the requested horizons."""
+    row = (
+        session.query(MedicineForecast)
+        .filter(MedicineForecast.storeId == req.store_id, MedicineForecast.medicineId == req.medicine_id)
+        .one_or_none()
+    )
+    if row is None:
+        raise HTTPException(404, "No precomputed forecast for this medicine yet")
+    if row.error:
+        raise HTTPException(400, row.error)
+
+    if not req.horizon_days or not set(req.horizon_days) <= set(row.horizonDays):
+        raise HTTPException(400, f"Precomputed forecasts cover horizons {row.horizonDays}")
+
+    result = dict(row.result)
+    keys = [str(h) for h in req.horizon_days]
+    result["demand_forecast"] = {k: result["demand_forecast"][k] for k in keys}
+    result["reorder_quantity"] = {k: result["reorder_quantity"][k] for k in keys}
+    result["reorder_now"] = result["reorder_quantity"][str(min(req.horizon_days))] > 0
+    result["generated_at"] = row.generatedAt
+    return ForecastResponse(**result)
+
+
+def load_store_forecast_inputs(
+    session: Session, store_id: str, medicine_ids: list[str] | None
+) -> dict[str, dict]:
+    """
+    Everything forecast_medicine needs for many medicines of a store, keyed
+    by medicine id, in five grouped queries instead of four per medicine.
+    """
+    medicines = session.query(Medicine.id, Medicine.brandName).filter(Medicine.storeId == store_id)
+    if medicine_ids is None:
+        medicines = medicines.filter(Medicine.isActive.is_(True))
+    else:
+        medicines = medicines.filter(Medicine.id.in_(medicine_ids))
+    names = {m.id: decrypt_cell(m.brandName) for m in medicines.all()}
+    if not names:
+        return {}
+
+    def in_scope(model):
+        # pushing a long id list into IN costs more than filtering the whole store
+        if medicine_ids is None:
+            return model.storeId == store_id
+        return and_(model.storeId == store_id, model.medicineId.in_(list(names)))
+
+    sales_day = func.date(StockMovement.createdAt)
+    sales = pd.DataFrame(
+        session.query(StockMovement.medicineId, sales_day, func.sum(-StockMovement.delta))
+        .filter(in_scope(StockMovement), StockMovement.delta < 0)  # sales only
+        .group_by(StockMovement.medicineId, sales_day)
+        .order_by(StockMovement.medicineId, sales_day)
+        .all(),
+        columns=["medicineId", "ds", "y"],
+    )
+    sales["ds"] = pd.to_datetime(sales["ds"])
+    sales["y"] = sales["y"].clip(lower=0)
+
+    price_day = func.date(InventoryBatch.createdAt)
+    prices = pd.DataFrame(
+        session.query(InventoryBatch.medicineId, price_day, func.avg(InventoryBatch.mrp))
+        .filter(in_scope(InventoryBatch), InventoryBatch.mrp.isnot(None))
+        .group_by(InventoryBatch.medicineId, price_day)
+        .order_by(InventoryBatch.medicineId, price_day)
+        .all(),
+        columns=["medicineId", "ds", "y"],
+    )
+    prices["ds"] = pd.to_datetime(prices["ds"])
+    prices["y"] = prices["y"].astype(float)
+
+    batches: dict[str, list] = {}
+    for b in (
+        session.query(InventoryBatch.id, InventoryBatch.medicineId, InventoryBatch.qtyAvailable, InventoryBatch.expiryDate)
+        .filter(in_scope(InventoryBatch))
+        .all()
+    ):
+        batches.setdefault(b.medicineId, []).append(b)
+
+    empty = pd.DataFrame({"ds": pd.Series(dtype="datetime64[ns]"), "y": pd.Series(dtype=float)})
+    sales_by_medicine = {
+        k: g[["ds", "y"]].reset_index(drop=True) for k, g in sales.groupby("medicineId", sort=False)
+    }
+    prices_by_medicine = {
+        k: g[["ds", "y"]].reset_index(drop=True) for k, g in prices.groupby("medicineId", sort=False)
+    }
+    prophet_models = load_prophet_models(session, store_id, medicine_ids)
+
+    inputs = {}
+    for medicine_id, name in names.items():
+        current_stock, expiry_map = summarize_batches(batches.get(medicine_id, []))
+        inputs[medicine_id] = {
+            "medicine_name": name,
+            "sales_df": sales_by_medicine.get(medicine_id, empty),
+            "price_df": prices_by_medicine.get(medicine_id, empty),
+            "current_stock": current_stock,
+            "expiry_map": expiry_map,
+            "prophet_model": prophet_models.get(medicine_id),
+        }
+    return inputs
+
+
+def forecast_watermarks(session: Session, store_id: str, medicine_ids: list[str]) -> dict[str, tuple]:
+    """forecast_watermark for many medicines of a store in two grouped queries."""
+    movements = {
+        r[0]: r[1:]
+        for r in session.query(
+            StockMovement.medicineId, func.max(StockMovement.createdAt), func.count(StockMovement.id)
+        )
+        .filter(StockMovement.storeId == store_id, StockMovement.medicineId.in_(medicine_ids))
+        .group_by(StockMovement.medicineId)
+    }
+    batches = {
+        r[0]: r[1:]
+        for r in session.query(
+            InventoryBatch.medicineId,
+            func.max(InventoryBatch.updatedAt),
+            func.count(InventoryBatch.id),
+            func.sum(InventoryBatch.qtyAvailable),
         )
-        price_cutoff = price_df["ds"].max()
+        .filter(InventoryBatch.storeId == store_id, InventoryBatch.medicineId.in_(medicine_ids))
+        .group_by(InventoryBatch.medicineId)
+    }
+    today = datetime.utcnow().date()
+    return {
+        m: (*movements.get(m, (None, 0)), *batches.get(m, (None, 0, None)), today)
+        for m in medicine_ids
+    }
 
 
-        # PRICE SURGE DETECTION
-        price_surge_risk = None
+def prepare_forecast_batch(req: ForecastBatchRequest) -> tuple[dict, dict, dict]:
+    """
+    Splits a batch into cached responses and the inputs still to be fitted.
+    Returns (cached responses, inputs to fit, watermarks), all keyed by medicine id.
+    """
+    session = SessionLocal()
+    try:
+        inputs = load_store_forecast_inputs(session, req.store_id, req.medicine_ids)
+        watermarks = forecast_watermarks(session, req.store_id, list(inputs))
+    finally:
+        session.close()
 
-        if price_forecast:
-            recent_price = price_df["y"].tail(5).mean()
-            future_price = mean(p["qty"] for p in price_forecast[:5])
+    cached = {}
+    horizons = tuple(req.horizon_days)
+    for medicine_id in list(inputs):
+        response = FORECAST_CACHE.get((req.store_id, medicine_id, horizons), watermarks[medicine_id])
+        if response:
+            cached[medicine_id] = response
+            del inputs[medicine_id]
+    return cached, inputs, watermarks
 
-            pct_change = ((future_price - recent_price) / recent_price) * 100
 
-            if pct_change >= 15:
-                price_surge_risk = PriceSurgeRisk(
-                    risk_level="HIGH",
-                    expected_increase_pct=round(pct_change, 2),
-                    recommendation="Stock up before supplier price hike",
-                    baseline_price=round(recent_price, 2),
-                    recent_price=round(future_price, 2),
-                )
-            elif pct_change >= 7:
-                price_surge_risk = PriceSurgeRisk(
-                    risk_level="MEDIUM",
-                    expected_increase_pct=round(pct_change, 2),
-                    recommendation="Consider early procurement to protect margins",
-                    baseline_price=round(recent_price, 2),
-                    recent_price=round(future_price, 2),
+def forecast_batch_line(medicine_id: str, status: str, **fields) -> bytes:
+    return (json.dumps({"medicine_id": medicine_id, "status": status, **fields}, default=str) + "\n").encode()
+
+
+@app.post("/forecast/inventory/batch", tags=["Forecasting"])
+async def forecast_inventory_batch(req: ForecastBatchRequest):
+    """
+    Forecasts every active medicine of a store, or the given medicine_ids,
+    and streams one NDJSON line per medicine as soon as it is ready:
+
+        {"medicine_id": ..., "status": "ok", "forecast": {...ForecastResponse}}
+        {"medicine_id": ..., "status": "skipped", "detail": "Not enough sales data ..."}
+        {"medicine_id": ..., "status": "error", "detail": ...}
+
+    Series are read in a few grouped queries; models are fitted in parallel
+    on the forecast process pool, at most FORECAST_BATCH_MAX_IN_FLIGHT at a
+    time so a large batch leaves room for single forecasts. Cached
+    forecasts are streamed first, then
+    requested medicine_ids that do not exist ("error", "Medicine not
+    found"), then fitted forecasts in the order they finish.
+    """
+    if not req.horizon_days:
+        raise HTTPException(400, "horizon_days must not be empty")
+
+    cached, inputs, watermarks = await run_in_threadpool(prepare_forecast_batch, req)
+    if req.medicine_ids is not None:
+        missing = [m for m in req.medicine_ids if m not in cached and m not in inputs]
+    else:
+        missing = []
+
+    async def results():
+        loop = asyncio.get_running_loop()
+        queued = iter(inputs.items())
+        futures = {}
+        pending = set()
+
+        def submit_next():
+            while len(pending) < FORECAST_BATCH_MAX_IN_FLIGHT:
+                medicine_id, fields = next(queued, (None, None))
+                if medicine_id is None:
+                    return
+                future = loop.run_in_executor(
+                    FORECAST_POOL,
+                    partial(forecast_medicine, **fields, horizon_days=req.horizon_days),
                 )
+                futures[future] = medicine_id
+                pending.add(future)
+
+        # the first fits start before the first line goes out
+        submit_next()
+        try:
+            for medicine_id, response in cached.items():
+                yield forecast_batch_line(medicine_id, "ok", forecast=response.model_dump())
+            for medicine_id in missing:
+                yield forecast_batch_line(medicine_id, "error", detail="Medicine not found")
+
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                pending.difference_update(done)
+                submit_next()
+                for future in done:
+                    medicine_id = futures[future]
+                    try:
+                        response = await run_in_threadpool(
+                            forecast_response, req.store_id, medicine_id, future.result()
+                        )
+                    except InsufficientHistoryError as e:
+                        yield forecast_batch_line(medicine_id, "skipped", detail=str(e))
+                        continue
+                    except Exception as e:
+                        logger.exception(f"Batch forecast failed for medicine {medicine_id}")
+                        yield forecast_batch_line(medicine_id, "error", detail=str(e))
+                        continue
+
+                    key = (req.store_id, medicine_id, tuple(req.horizon_days))
+                    FORECAST_CACHE.put(key, watermarks[medicine_id], response)
+                    yield forecast_batch_line(medicine_id, "ok", forecast=response.model_dump())
+        finally:
+            # client went away: drop the fits that have not started yet
+            for future in pending:
+                future.cancel()
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def format_forecast_job(job: dict) -> ForecastJobResponse:
+    return ForecastJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        result=job["result"],
+        error=job["error"],
+        created_at=datetime.utcfromtimestamp(job["createdAt"]),
+        finished_at=datetime.utcfromtimestamp(job["finishedAt"]) if job["finishedAt"] else None,
+    )
 
-        # EXPIRY & WASTE ESTIMATION
-        expiry_risk = {}
-        estimated_waste_units = 0
-        demand_30d = demand_forecast.get("30", 0)
 
-        for batch_id, info in expiry_map.items():
-            if info["days_to_expiry"] <= 30:
-                expiry_risk[batch_id] = info["qty"]
-                if info["qty"] > demand_30d:
-                    estimated_waste_units += info["qty"] - demand_30d
+@app.post("/forecast/jobs", response_model=ForecastJobResponse, status_code=202, tags=["Forecasting"])
+async def submit_forecast_job(req: ForecastRequest):
+    """
+    Queues a live forecast on the forecast process pool and returns at once;
+    poll GET /forecast/jobs/{job_id} for the result. Jobs are kept in the
+    serving process, so the app must run as a single worker process. Unchanged data is
+    answered from the forecast cache without queueing.
+    """
+    if req.mode != "live":
+        raise HTTPException(400, "Precomputed forecasts are served by POST /forecast/inventory")
+
+    cached, inputs, watermark = await run_in_threadpool(prepare_inventory_forecast, req)
+    if cached:
+        return format_forecast_job(FORECAST_JOBS.get(FORECAST_JOBS.complete(cached)))
 
-        # PLOT DATA 
-        demand_plot = build_plot_data(
-            sales_df, demand_forecast_df, demand_cutoff
+    def on_result(result: dict) -> ForecastResponse:
+        response = forecast_response(req.store_id, req.medicine_id, result)
+        FORECAST_CACHE.put(forecast_cache_key(req), watermark, response)
+        return response
+
+    try:
+        job_id = FORECAST_JOBS.submit(
+            forecast_medicine, **inputs, horizon_days=req.horizon_days, on_result=on_result
         )
+    except JobQueueFullError as e:
+        raise HTTPException(429, f"Forecast queue is full ({e}), try again later")
+
+    return format_forecast_job(FORECAST_JOBS.get(job_id))
+
+
+@app.get("/forecast/jobs/{job_id}", response_model=ForecastJobResponse, tags=["Forecasting"])
+def get_forecast_job(job_id: str):
+    job = FORECAST_JOBS.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Forecast job not found")
+    return format_forecast_job(job)
+
 
-        price_plot = {
-            "history": [
-                {"date": d.strftime("%Y-%m-%d"), "qty": round(p, 2)}
-                for d, p in zip(price_df["ds"], price_df["y"])
-            ],
-            "forecast": price_forecast,
-            "confidence": price_confidence,
-            "cutoff_date": price_cutoff.strftime("%Y-%m-%d"),
+@app.delete("/forecast/jobs/{job_id}", response_model=ForecastJobResponse, tags=["Forecasting"])
+def cancel_forecast_job(job_id: str):
+    job = FORECAST_JOBS.cancel(job_id)
+    if job is None:
+        raise HTTPException(404, "Forecast job not found")
+    return format_forecast_job(job)
+
+
+def precompute_store_forecasts(store_id: str, pool: ProcessPoolExecutor) -> int:
+    """
+    Fits every active medicine of a store on `pool`, the precompute's own
+    process pool, and replaces the store's MedicineForecast rows. Medicines without enough
+    history get a row with the error, which precomputed reads return.
+    """
+    session = SessionLocal()
+    try:
+        inputs = load_store_forecast_inputs(session, store_id, None)
+    finally:
+        session.close()
+
+    generated_at = datetime.utcnow()
+    futures = {
+        pool.submit(forecast_medicine, **fields, horizon_days=FORECAST_PRECOMPUTE_HORIZONS): medicine_id
+        for medicine_id, fields in inputs.items()
+    }
+
+    rows = []
+    for future in as_completed(futures):
+        row = {
+            "id": new_uuid(),
+            "storeId": store_id,
+            "medicineId": futures[future],
+            "horizonDays": FORECAST_PRECOMPUTE_HORIZONS,
+            "demandModel": None,
+            "reorderNow": False,
+            "result": None,
+            "error": None,
+            "generatedAt": generated_at,
         }
+        try:
+            result = forecast_response(store_id, futures[future], future.result()).model_dump(mode="json")
+            row.update(demandModel=result["demand_model"], reorderNow=result["reorder_now"], result=result)
+        except InsufficientHistoryError as e:
+            row["error"] = str(e)
+        except Exception as e:
+            logger.exception(f"Forecast precompute failed for medicine {futures[future]}")
+            row["error"] = f"Forecast failed: {e}"
+        rows.append(row)
 
-        # FINAL RESPONSE
-        return ForecastResponse(
-            medicine_name=medicine_name,
-            current_stock=current_stock,
+    session = SessionLocal()
+    try:
+        for start in range(0, len(rows), 500):
+            stmt = dialect_insert(MedicineForecast).values(rows[start:start + 500])
+            session.execute(stmt.on_conflict_do_update(
+                index_elements=["storeId", "medicineId"],
+                set_={
+                    c: stmt.excluded[c]
+                    for c in ("horizonDays", "demandModel", "reorderNow", "result", "error", "generatedAt")
+                },
+            ))
+        # medicines deactivated or deleted since the last run
+        session.query(MedicineForecast).filter(
+            MedicineForecast.storeId == store_id,
+            MedicineForecast.generatedAt < generated_at,
+        ).delete(synchronize_session=False)
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
 
-            demand_forecast=demand_forecast,
-            reorder_quantity=reorder_quantity,
-            reorder_now=reorder_now,
+    return len(rows)
 
-            expiry_risk=expiry_risk,
-            estimated_waste_units=estimated_waste_units,
 
-            plot_data={
-                "demand": demand_plot,
-                "price": price_plot,
-            },
+@contextmanager
+def forecast_precompute_lock():
+    """
+    Postgres advisory lock taken without waiting, so only one worker
+    process runs the nightly precompute. Yields whether it was acquired;
+    always acquired on databases without advisory locks (single process).
+    """
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
 
-            price_surge_risk=price_surge_risk,
-            price_plot_data=price_plot,
-        )
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        params = {"key": "forecast:precompute"}
+        acquired = conn.execute(text("SELECT pg_try_advisory_lock(hashtext(:key))"), params).scalar()
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                conn.execute(text("SELECT pg_advisory_unlock(hashtext(:key))"), params)
 
+
+def precompute_all_forecasts(stop: threading.Event):
+    session = SessionLocal()
+    try:
+        store_ids = [s.id for s in session.query(Store.id).filter(Store.isActive == True)]
     finally:
         session.close()
 
+    started = time.monotonic()
+    medicines = 0
+    # FORECAST_POOL serves request fits and stays bounded by the job queue;
+    # the precompute brings its own workers for the length of the run
+    with ProcessPoolExecutor(
+        max_workers=FORECAST_PRECOMPUTE_WORKERS,
+        mp_context=multiprocessing.get_context("spawn"),
+    ) as pool:
+        for store_id in store_ids:
+            if stop.is_set():
+                return
+            try:
+                medicines += precompute_store_forecasts(store_id, pool)
+            except Exception:
+                logger.exception(f"Forecast precompute failed for store {store_id}")
+
+    logger.info(
+        f"Precomputed forecasts for {medicines} medicines in {len(store_ids)} stores "
+        f"in {time.monotonic() - started:.0f}s"
+    )
+
+
+def seconds_until_forecast_precompute(now: datetime) -> float:
+    next_run = now.replace(hour=FORECAST_PRECOMPUTE_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def run_forecast_precompute(stop: threading.Event):
+    """Runs the precompute every day at FORECAST_PRECOMPUTE_HOUR (UTC) until `stop` is set."""
+    while not stop.wait(seconds_until_forecast_precompute(datetime.utcnow())):
+        try:
+            with forecast_precompute_lock() as acquired:
+                if acquired:
+                    precompute_all_forecasts(stop)
+                else:
+                    logger.info("Forecast precompute already running in another worker")
+        except Exception:
+            logger.exception("Forecast precompute failed")
 
-        
 
 if __name__ == "__main__":
     import uvicorn
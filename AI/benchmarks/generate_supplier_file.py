@@ -0,0 +1,131 @@
+"""
+Synthetic supplier upload files for benchmarking ingestion.
+
+Produces XLSX or CSV files with the template's headers. SKUs are reused
+across rows the way real restocks repeat products, and a configurable
+share of rows is invalid (zero/garbage quantity, unparseable expiry) or
+already expired, so every rejection path gets exercised.
+
+    python benchmarks/generate_supplier_file.py --rows 100000 --format csv --out /tmp/supplier_100k.csv
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# Same order and wording as templates/supplier_upload_template.xlsx
+HEADERS = [
+    "Medicine SKU", "NDC", "Brand Name", "Generic Name", "Dosage Form",
+    "Strength", "Unit of Measure", "Category", "Batch Number", "Quantity Received",
+    "Expiry Date", "Purchase Price", "MRP", "Received At", "Location", "Notes",
+]
+
+GENERICS = [
+    "Paracetamol", "Amoxicillin", "Metformin", "Atorvastatin", "Amlodipine",
+    "Omeprazole", "Azithromycin", "Cetirizine", "Ibuprofen", "Losartan",
+    "Pantoprazole", "Montelukast", "Levothyroxine", "Dolo", "Ciprofloxacin",
+]
+BRAND_SUFFIXES = ["", " Forte", " Plus", " XR", " DS", " 650", " Kid"]
+DOSAGE_FORMS = ["Tablet", "Capsule", "Syrup", "Injection", "Ointment", "Drops"]
+STRENGTHS = ["5 mg", "10 mg", "250 mg", "500 mg", "650 mg", "5 ml", "1%"]
+UOMS = ["strip", "bottle", "vial", "tube", "box"]
+CATEGORIES = ["Analgesic", "Antibiotic", "Antidiabetic", "Cardiac", "Gastro", "Allergy"]
+LOCATIONS = [f"{aisle}-{shelf:02d}" for aisle in "ABCDEF" for shelf in range(1, 21)]
+
+
+def generate_supplier_frame(
+    rows: int,
+    *,
+    sku_reuse: float = 20.0,
+    bad_ratio: float = 0.02,
+    expired_ratio: float = 0.05,
+    date_format: str = "%Y-%m-%d",
+    seed: int = 7,
+) -> pd.DataFrame:
+    """
+    Builds a supplier sheet of `rows` rows. About rows / sku_reuse distinct
+    SKUs are used; `bad_ratio` of rows are invalid and `expired_ratio`
+    carry an expiry date in the past.
+    """
+    rng = np.random.default_rng(seed)
+    n_skus = max(1, int(rows / sku_reuse))
+
+    sku_ids = rng.integers(0, n_skus, rows)
+    generic_idx = sku_ids % len(GENERICS)
+    today = pd.Timestamp.today().normalize()
+
+    expiry = today + pd.to_timedelta(rng.integers(30, 1100, rows), unit="D")
+    expired = rng.random(rows) < expired_ratio
+    expiry = expiry.where(~expired, today - pd.to_timedelta(rng.integers(1, 400, rows), unit="D"))
+    received = today - pd.to_timedelta(rng.integers(0, 30, rows), unit="D")
+
+    purchase = np.round(rng.uniform(2, 900, rows), 2)
+
+    df = pd.DataFrame({
+        "Medicine SKU": np.char.add("SKU-", np.char.zfill(sku_ids.astype(str), 7)),
+        "NDC": np.char.add("NDC-", np.char.zfill((sku_ids * 7919 % 10_000_000).astype(str), 7)),
+        "Brand Name": np.char.add(
+            np.array(GENERICS)[generic_idx],
+            np.array(BRAND_SUFFIXES)[sku_ids % len(BRAND_SUFFIXES)],
+        ),
+        "Generic Name": np.array(GENERICS)[generic_idx],
+        "Dosage Form": np.array(DOSAGE_FORMS)[sku_ids % len(DOSAGE_FORMS)],
+        "Strength": np.array(STRENGTHS)[sku_ids % len(STRENGTHS)],
+        "Unit of Measure": np.array(UOMS)[sku_ids % len(UOMS)],
+        "Category": np.array(CATEGORIES)[sku_ids % len(CATEGORIES)],
+        "Batch Number": np.char.add("B", rng.integers(100000, 999999, rows).astype(str)),
+        "Quantity Received": rng.integers(1, 500, rows).astype(object),
+        "Expiry Date": expiry.strftime(date_format).astype(object),
+        "Purchase Price": purchase,
+        "MRP": np.round(purchase * rng.uniform(1.1, 1.6, rows), 2),
+        "Received At": received.strftime(date_format),
+        "Location": np.array(LOCATIONS)[rng.integers(0, len(LOCATIONS), rows)],
+        "Notes": "",
+    }, columns=HEADERS)
+
+    # invalid rows: half with a bad quantity, half with an unparseable expiry
+    bad = np.flatnonzero(rng.random(rows) < bad_ratio)
+    bad_qty, bad_expiry = bad[::2], bad[1::2]
+    df.loc[bad_qty, "Quantity Received"] = rng.choice([0, "n/a", ""], len(bad_qty))
+    df.loc[bad_expiry, "Expiry Date"] = rng.choice(["", "soon", "31/02/2099"], len(bad_expiry))
+
+    return df
+
+
+def write_supplier_file(df: pd.DataFrame, out: Path) -> Path:
+    out = Path(out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    if out.suffix.lower() == ".csv":
+        df.to_csv(out, index=False)
+    else:
+        df.to_excel(out, index=False)
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--out", type=Path, default=None)
+    parser.add_argument("--sku-reuse", type=float, default=20.0, help="average rows per distinct SKU")
+    parser.add_argument("--bad-ratio", type=float, default=0.02)
+    parser.add_argument("--expired-ratio", type=float, default=0.05)
+    parser.add_argument("--date-format", default="%Y-%m-%d")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    out = args.out or Path(f"/tmp/zenith_bench/supplier_{args.rows}.{args.format}")
+    df = generate_supplier_frame(
+        args.rows,
+        sku_reuse=args.sku_reuse,
+        bad_ratio=args.bad_ratio,
+        expired_ratio=args.expired_ratio,
+        date_format=args.date_format,
+        seed=args.seed,
+    )
+    print(write_supplier_file(df, out))
+
+
+if __name__ == "__main__":
+    main()
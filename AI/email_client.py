@@ -1,7 +1,150 @@
-import requests
+import asyncio
+import os
+import random
+import threading
+from concurrent.futures import Future
+
+import httpx
+
+from logging_setup import setup_app_logger
+
+logger = setup_app_logger("email_client")
 
 BASE_EMAIL_URL = "https://synapstorebackend.vercel.app/api/v1/email"
 
+# Requests in flight to the email backend at once; the rest wait their turn
+EMAIL_MAX_CONCURRENCY = int(os.getenv("EMAIL_MAX_CONCURRENCY", "10"))
+# Attempts per email for network errors, 429 and 5xx responses
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_BACKOFF_BASE_SECONDS = float(os.getenv("EMAIL_BACKOFF_BASE_SECONDS", "0.5"))
+EMAIL_BACKOFF_MAX_SECONDS = float(os.getenv("EMAIL_BACKOFF_MAX_SECONDS", "10"))
+EMAIL_TIMEOUT_SECONDS = float(os.getenv("EMAIL_TIMEOUT_SECONDS", "10"))
+
+RETRY_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class EmailClient:
+    """
+    Shared client for the email backend.
+
+    One pooled httpx.AsyncClient lives on a dedicated event-loop thread,
+    started on first use. At most `max_concurrency` requests are in flight;
+    network errors, timeouts, 429 and 5xx responses are retried with
+    exponential backoff and full jitter. Other 4xx responses fail at once.
+
+    Worker threads hand emails over with `submit`, which returns a
+    concurrent Future immediately; coroutines on any loop `await post(...)`.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_concurrency: int = EMAIL_MAX_CONCURRENCY,
+        max_attempts: int = EMAIL_MAX_ATTEMPTS,
+        backoff_base: float = EMAIL_BACKOFF_BASE_SECONDS,
+        backoff_max: float = EMAIL_BACKOFF_MAX_SECONDS,
+        timeout: float = EMAIL_TIMEOUT_SECONDS,
+    ):
+        self._max_concurrency = max_concurrency
+        self._max_attempts = max_attempts
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._thread: threading.Thread | None = None
+        self._client: httpx.AsyncClient | None = None
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=loop.run_forever, name="email-client", daemon=True)
+                self._thread.start()
+                asyncio.run_coroutine_threadsafe(self._open(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _open(self):
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._client = httpx.AsyncClient(
+            timeout=self._timeout,
+            headers={"Content-Type": "application/json"},
+            limits=httpx.Limits(
+                max_connections=self._max_concurrency,
+                max_keepalive_connections=self._max_concurrency,
+            ),
+        )
+
+    def _backoff(self, attempt: int) -> float:
+        # full jitter: uniform between 0 and the capped exponential delay
+        return random.uniform(0, min(self._backoff_max, self._backoff_base * 2 ** attempt))
+
+    async def _post(self, url: str, payload: dict) -> httpx.Response:
+        for attempt in range(self._max_attempts):
+            last_attempt = attempt == self._max_attempts - 1
+            try:
+                async with self._semaphore:
+                    resp = await self._client.post(url, json=payload)
+            except httpx.TransportError as e:
+                if last_attempt:
+                    raise
+                logger.warning(f"Email request to {url} failed ({e!r}), retrying")
+            else:
+                if resp.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    return resp
+                logger.warning(f"Email backend returned {resp.status_code} for {url}, retrying")
+
+            await asyncio.sleep(self._backoff(attempt))
+
+    def submit(self, url: str, payload: dict) -> Future:
+        """
+        Queues a POST from any thread without waiting for it. The Future
+        resolves to the final httpx.Response; failures are logged.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._post(url, payload), self._ensure_loop())
+        future.add_done_callback(lambda f: _log_failure(url, f))
+        return future
+
+    async def post(self, url: str, payload: dict) -> httpx.Response:
+        """Awaitable POST from any event loop, resolving to the final response."""
+        loop = self._ensure_loop()
+        if asyncio.get_running_loop() is loop:
+            return await self._post(url, payload)
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._post(url, payload), loop))
+
+    def close(self):
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join()
+        loop.close()
+
+
+def _log_failure(url: str, future: Future):
+    if future.cancelled():
+        return
+    exc = future.exception()
+    if exc is not None:
+        logger.error(f"Email request to {url} failed: {exc!r}")
+        return
+    resp = future.result()
+    if resp.status_code >= 400:
+        logger.error(f"Email request to {url} failed with {resp.status_code}: {resp.text}")
+
+
+EMAIL_CLIENT = EmailClient()
+
+
+def send_template_email(template: str, payload: dict) -> Future:
+    """Queues a templated email, e.g. "storeowner-dispatch", on the shared client."""
+    return EMAIL_CLIENT.submit(f"{BASE_EMAIL_URL}/{template}", payload)
+
 
 def send_storeowner_dispatch_email(
     *,
@@ -11,7 +154,7 @@ def send_storeowner_dispatch_email(
     invoice_id: str,
     items: dict,
     expected_delivery: str,
-):
+) -> Future:
     payload = {
         "to_email": to_email,
         "store_name": store_name,
@@ -21,14 +164,7 @@ def send_storeowner_dispatch_email(
         "expected_delivery": expected_delivery,
     }
 
-    resp = requests.post(
-        f"{BASE_EMAIL_URL}/storeowner-dispatch",
-        headers={"Content-Type": "application/json"},
-        json=payload,
-        timeout=10,
-    )
-
-    resp.raise_for_status()
+    return send_template_email("storeowner-dispatch", payload)
 
 
 def send_supplier_failure_email(
@@ -39,7 +175,7 @@ def send_supplier_failure_email(
     supplier_name: str,
     invoice_id: str,
     failure_reason: str,
-):
+) -> Future:
     payload = {
         "to_email": to_email,
         "store_name": store_name,
@@ -49,11 +185,4 @@ def send_supplier_failure_email(
         "failure_reason": failure_reason,
     }
 
-    resp = requests.post(
-        f"{BASE_EMAIL_URL}/supplier-delivery-failed",
-        headers={"Content-Type": "application/json"},
-        json=payload,
-        timeout=10,
-    )
-
-    resp.raise_for_status()
+    return send_template_email("supplier-delivery-failed", payload)
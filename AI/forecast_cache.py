@@ -0,0 +1,33 @@
+import threading
+from collections import OrderedDict
+
+
+class WatermarkCache:
+    """
+    In-process LRU cache whose entries are valid for one data watermark.
+
+    Each entry stores the watermark it was computed at; a lookup with a
+    different watermark is a miss, so entries go stale as soon as the
+    underlying rows change and never need explicit invalidation. At most
+    `max_entries` entries are kept, least recently used first out.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key, watermark):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != watermark:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, watermark, value):
+        with self._lock:
+            self._entries[key] = (watermark, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
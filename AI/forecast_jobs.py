@@ -0,0 +1,137 @@
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+from logging_setup import setup_app_logger
+
+logger = setup_app_logger("forecast_jobs")
+
+
+class JobQueueFullError(Exception):
+    """Too many unfinished jobs; the caller should retry later."""
+
+
+class ForecastJobQueue:
+    """
+    In-process registry of forecast jobs running on an executor (a process
+    pool for model fits).
+
+    At most `max_pending` jobs may be queued or running; submitting more
+    raises JobQueueFullError. Finished jobs are kept for `ttl_seconds` so
+    clients can poll their results, then forgotten.
+
+    Cancelling a queued job drops it from the pool's queue. A job already
+    fitting in a worker cannot be interrupted; it is marked CANCELLED and
+    its result discarded when the worker finishes.
+
+    Results are post-processed (`on_result`) on the queue's own
+    `result_workers` threads: done callbacks of a process pool run on its
+    manager thread, which must not wait on database writes.
+    """
+
+    def __init__(self, executor: Executor, *, max_pending: int, ttl_seconds: float, result_workers: int = 2):
+        self._executor = executor
+        self._finishers = ThreadPoolExecutor(max_workers=result_workers, thread_name_prefix="forecast-job")
+        self._max_pending = max_pending
+        self._ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._jobs: dict[str, dict] = {}
+
+    def submit(self, fn, *args, on_result=None, **kwargs) -> str:
+        """
+        Queues fn(*args, **kwargs) and returns the job id. `on_result`, if
+        given, maps the raw result to the stored one; it runs on a result
+        worker thread and may raise to fail the job.
+        """
+        with self._lock:
+            self._evict_expired()
+            # jobs cancelled mid-fit still hold a worker until they finish
+            pending = sum(1 for job in self._jobs.values() if job["future"] and not job["future"].done())
+            if pending >= self._max_pending:
+                raise JobQueueFullError(f"{pending} forecast jobs are already pending")
+
+            job_id = str(uuid.uuid4())
+            job = self._jobs[job_id] = self._new_job(job_id)
+            job["future"] = self._executor.submit(fn, *args, **kwargs)
+
+        # the callback only hands off: it runs on the pool's manager thread,
+        # or on the caller's if the job already finished
+        job["future"].add_done_callback(lambda f: self._finishers.submit(self._finish, job_id, f, on_result))
+        return job_id
+
+    def complete(self, result) -> str:
+        """Records a job that is already done, e.g. a forecast served from cache."""
+        with self._lock:
+            self._evict_expired()
+            job_id = str(uuid.uuid4())
+            job = self._jobs[job_id] = self._new_job(job_id)
+            job.update(status="SUCCEEDED", result=result, finishedAt=time.time())
+        return job_id
+
+    def get(self, job_id: str) -> dict | None:
+        """Snapshot of a job: id, status, result, error, createdAt, finishedAt."""
+        with self._lock:
+            self._evict_expired()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+
+            status = job["status"]
+            if status == "QUEUED" and job["future"] is not None and job["future"].running():
+                status = "RUNNING"
+            return {k: v for k, v in job.items() if k != "future"} | {"status": status}
+
+    def cancel(self, job_id: str) -> dict | None:
+        """Cancels an unfinished job; finished jobs are returned unchanged."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job["finishedAt"] is None:
+                job["future"].cancel()
+                job.update(status="CANCELLED", finishedAt=time.time())
+        return self.get(job_id)
+
+    def shutdown(self):
+        self._finishers.shutdown(wait=False, cancel_futures=True)
+
+    def _new_job(self, job_id: str) -> dict:
+        return {
+            "id": job_id,
+            "status": "QUEUED",
+            "result": None,
+            "error": None,
+            "createdAt": time.time(),
+            "finishedAt": None,
+            "future": None,
+        }
+
+    def _finish(self, job_id: str, future: Future, on_result):
+        if future.cancelled():
+            return
+
+        try:
+            result = future.result()
+            if on_result is not None:
+                result = on_result(result)
+            outcome = {"status": "SUCCEEDED", "result": result}
+        except Exception as e:
+            outcome = {"status": "FAILED", "error": str(e)}
+            logger.warning(f"Forecast job {job_id} failed: {e!r}")
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            # cancelled while running: the result is no longer wanted
+            if job is None or job["status"] == "CANCELLED":
+                return
+            job.update(outcome, finishedAt=time.time())
+
+    def _evict_expired(self):
+        cutoff = time.time() - self._ttl_seconds
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finishedAt"] is not None and job["finishedAt"] < cutoff
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
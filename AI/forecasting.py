@@ -0,0 +1,459 @@
+from datetime import timedelta
+from statistics import mean
+
+import numpy as np
+import pandas as pd
+import xxhash
+from prophet import Prophet
+from prophet.serialize import model_from_json, model_to_json
+
+from logging_setup import setup_app_logger
+
+logger = setup_app_logger("forecasting")
+
+# Units kept on hand on top of the forecast demand when sizing a reorder
+SAFETY_STOCK = 10
+
+# Prophet is only worth its fit time on long, dense daily histories
+PROPHET_MIN_DAYS = 180
+PROPHET_MIN_DENSITY = 0.8
+# Below this share of days with sales, demand is intermittent (ADI above 1.32, Syntetos-Boylan)
+INTERMITTENT_MAX_DENSITY = 1 / 1.32
+# Weeks of history averaged per weekday by the seasonal-naive model
+SEASONAL_NAIVE_WEEKS = 4
+# Smoothing constants tried by exponential smoothing; Croston uses the fixed one
+SES_ALPHAS = (0.05, 0.1, 0.2, 0.3, 0.5)
+CROSTON_ALPHA = 0.1
+# Two-sided 80% band, the same width Prophet reports by default
+INTERVAL_Z = 1.2816
+
+
+class InsufficientHistoryError(ValueError):
+    """The sales or price history is too short to forecast from."""
+
+
+def training_watermark(df: pd.DataFrame) -> str:
+    """Fingerprint of a training series; a model fitted on an equal series can be reused."""
+    h = xxhash.xxh3_64()
+    h.update(df["ds"].to_numpy(dtype="datetime64[ns]").tobytes())
+    h.update(df["y"].to_numpy(dtype=float).tobytes())
+    return h.hexdigest()
+
+
+def warm_start_params(model: Prophet) -> dict:
+    """Fitted (MAP) parameters of a model, as Prophet.fit(init=...) takes them."""
+    return {
+        "k": model.params["k"][0][0],
+        "m": model.params["m"][0][0],
+        "sigma_obs": model.params["sigma_obs"][0][0],
+        "delta": model.params["delta"][0],
+        "beta": model.params["beta"][0],
+    }
+
+
+def new_prophet_model() -> Prophet:
+    return Prophet(
+        weekly_seasonality=True,
+        yearly_seasonality=True,
+        daily_seasonality=False,
+    )
+
+
+def prophet_forecast_series(df: pd.DataFrame, days: int, previous: dict | None = None):
+    """
+    Fits Prophet on `df` and forecasts `days` days past it.
+
+    `previous` is an earlier fit ({"watermark", "model"}, the model as
+    Prophet JSON). It is reused without fitting when the series has not
+    changed, and otherwise seeds the optimizer so the refit converges in
+    fewer iterations. Returns (forecast, fit to persist or None when the
+    previous one was reused).
+    """
+    watermark = training_watermark(df)
+    if previous and previous["watermark"] == watermark:
+        model = model_from_json(previous["model"])
+        return model.predict(model.make_future_dataframe(periods=days)), None
+
+    model = new_prophet_model()
+    if previous:
+        try:
+            model.fit(df, init=warm_start_params(model_from_json(previous["model"])))
+        except Exception as e:
+            # e.g. parameter shapes changed with the history length; refit from scratch
+            logger.warning(f"Prophet warm start failed ({e!r}), fitting from scratch")
+            model = new_prophet_model().fit(df)
+    else:
+        model.fit(df)
+
+    forecast = model.predict(model.make_future_dataframe(periods=days))
+    return forecast, {"watermark": watermark, "model": model_to_json(model)}
+
+
+def daily_series(df: pd.DataFrame) -> pd.Series:
+    """Daily quantities from first to last day, with days missing from `df` as 0."""
+    s = df.set_index("ds")["y"].astype(float)
+    return s.groupby(s.index.normalize()).sum().asfreq("D", fill_value=0.0)
+
+
+def future_frame(last_day: pd.Timestamp, yhat, sigma) -> pd.DataFrame:
+    """Forecast rows for the days after `last_day`, shaped like Prophet's output."""
+    yhat = np.asarray(yhat, dtype=float)
+    return pd.DataFrame({
+        "ds": pd.date_range(last_day + pd.Timedelta(days=1), periods=len(yhat), freq="D"),
+        "yhat": yhat,
+        "yhat_lower": yhat - INTERVAL_Z * sigma,
+        "yhat_upper": yhat + INTERVAL_Z * sigma,
+    })
+
+
+def ses_levels(y: np.ndarray, alphas) -> np.ndarray:
+    """
+    Simple exponential smoothing levels, one row per alpha:
+    level[t] = alpha * y[t] + (1 - alpha) * level[t - 1], level[0] = y[0].
+    """
+    series = pd.Series(y)
+    return np.vstack([series.ewm(alpha=a, adjust=False).mean().to_numpy() for a in alphas])
+
+
+def ses_forecast(y: np.ndarray, days: int):
+    """Flat forecast at the smoothed level, alpha picked by one-step-ahead squared error."""
+    levels = ses_levels(y, SES_ALPHAS)
+    errors = y[1:] - levels[:, :-1]
+    best = int(np.argmin((errors ** 2).sum(axis=1))) if len(y) > 1 else 0
+    alpha = SES_ALPHAS[best]
+    sigma = errors[best].std() if len(y) > 2 else 0.0
+
+    h = np.arange(1, days + 1)
+    return np.full(days, levels[best, -1]), sigma * np.sqrt(1 + (h - 1) * alpha ** 2)
+
+
+def croston_sba_forecast(y: np.ndarray, days: int):
+    """
+    Croston's method with the Syntetos-Boylan bias correction: demand sizes
+    and the intervals between them are smoothed separately and the flat
+    forecast is (1 - alpha / 2) * size / interval.
+    """
+    nonzero = np.flatnonzero(y)
+    if len(nonzero) == 0:
+        return np.zeros(days), np.zeros(days)
+
+    sizes = y[nonzero]
+    # the first interval counts from the start of the history
+    intervals = np.diff(nonzero, prepend=-1).astype(float)
+    size = ses_levels(sizes, (CROSTON_ALPHA,))[0]
+    interval = ses_levels(intervals, (CROSTON_ALPHA,))[0]
+    rate = (1 - CROSTON_ALPHA / 2) * size / interval
+
+    # the in-sample rate holds from each demand until the next one
+    fitted = np.zeros(len(y))
+    fitted[nonzero[0] + 1:] = np.repeat(rate, np.diff(nonzero, append=len(y)))[:len(y) - nonzero[0] - 1]
+    sigma = (y[nonzero[0] + 1:] - fitted[nonzero[0] + 1:]).std() if len(y) > nonzero[0] + 2 else 0.0
+
+    return np.full(days, rate[-1]), np.full(days, sigma)
+
+
+def seasonal_naive_forecast(y: np.ndarray, days: int):
+    """Each future day repeats its weekday's mean over the last SEASONAL_NAIVE_WEEKS weeks."""
+    weeks = min(SEASONAL_NAIVE_WEEKS, len(y) // 7)
+    profile = y[len(y) - weeks * 7:].reshape(weeks, 7).mean(axis=0)
+    residuals = y[7:] - y[:-7]
+    sigma = residuals.std() if len(residuals) > 1 else 0.0
+
+    h = np.arange(days)
+    return profile[h % 7], sigma * np.sqrt(h // 7 + 1)
+
+
+def seasonal_naive_error(y: np.ndarray) -> float:
+    """Mean absolute one-week-ahead error of the seasonal-naive model on the last weeks."""
+    return float(np.abs(y[7:] - y[:-7])[-SEASONAL_NAIVE_WEEKS * 7:].mean())
+
+
+def ses_error(y: np.ndarray) -> float:
+    """Mean absolute one-step error of the best exponential smoothing over the same span."""
+    levels = ses_levels(y, SES_ALPHAS)
+    errors = np.abs(y[1:] - levels[:, :-1])[:, -SEASONAL_NAIVE_WEEKS * 7:]
+    return float(errors.mean(axis=1).min())
+
+
+def select_demand_model(y: np.ndarray) -> str:
+    """
+    Picks a demand model from the length and density of a daily series:
+    Prophet for long dense histories, Croston/SBA for intermittent demand,
+    and otherwise seasonal-naive or exponential smoothing, whichever had
+    the smaller recent in-sample error.
+    """
+    density = np.count_nonzero(y) / len(y)
+
+    if len(y) >= PROPHET_MIN_DAYS and density >= PROPHET_MIN_DENSITY:
+        return "prophet"
+    if density < INTERMITTENT_MAX_DENSITY:
+        return "croston_sba"
+    if len(y) >= 14 and seasonal_naive_error(y) < ses_error(y):
+        return "seasonal_naive"
+    return "ses"
+
+
+def forecast_demand_series(
+    df: pd.DataFrame, days: int, model: str = "auto", prophet_model: dict | None = None
+) -> tuple[pd.DataFrame, str, dict | None]:
+    """
+    Forecasts `days` days of a daily demand series with `model`, or the one
+    select_demand_model picks for "auto". Returns the forecast in Prophet's
+    output columns (ds, yhat, yhat_lower, yhat_upper), the model used and,
+    for a new Prophet fit, the fit to persist (see prophet_forecast_series).
+    Only Prophet's frame includes the fitted history; consumers take the
+    rows after the last observed day.
+    """
+    series = daily_series(df)
+    y = series.to_numpy()
+
+    if model == "auto":
+        model = select_demand_model(y)
+
+    if model == "prophet":
+        forecast, fit = prophet_forecast_series(df, days, prophet_model)
+        return forecast, model, fit
+    if model == "croston_sba":
+        yhat, sigma = croston_sba_forecast(y, days)
+    elif model == "seasonal_naive":
+        yhat, sigma = seasonal_naive_forecast(y, days)
+    elif model == "ses":
+        yhat, sigma = ses_forecast(y, days)
+    else:
+        raise ValueError(f"Unknown demand model: {model}")
+
+    return future_frame(series.index[-1], yhat, sigma), model, None
+
+
+def build_plot_data(df: pd.DataFrame, forecast: pd.DataFrame, history_cutoff: pd.Timestamp):
+    history = [
+        {"date": d.strftime("%Y-%m-%d"), "qty": int(y)}
+        for d, y in zip(df["ds"], df["y"])
+    ]
+
+    future = forecast[forecast["ds"] > history_cutoff]
+
+    forecast_points = [
+        {
+            "date": row.ds.strftime("%Y-%m-%d"),
+            "qty": int(max(0, row.yhat)),
+        }
+        for _, row in future.iterrows()
+    ]
+
+    confidence = [
+        {
+            "date": row.ds.strftime("%Y-%m-%d"),
+            "low": int(max(0, row.yhat_lower)),
+            "high": int(max(0, row.yhat_upper)),
+        }
+        for _, row in future.iterrows()
+    ]
+
+    return {
+        "history": history,
+        "forecast": forecast_points,
+        "confidence": confidence,
+        "cutoff_date": history_cutoff.strftime("%Y-%m-%d"),
+    }
+
+
+def detect_price_surge(price_df: pd.DataFrame):
+    if len(price_df) < 8:
+        return None
+
+    prices = price_df["y"].tolist()
+
+    baseline = mean(prices[-8:-4])
+    recent = mean(prices[-4:])
+
+    if baseline <= 0:
+        return None
+
+    pct = ((recent - baseline) / baseline) * 100
+
+    if pct < 15:
+        return None
+
+    if pct >= 50:
+        level = "CRITICAL"
+    elif pct >= 30:
+        level = "HIGH"
+    else:
+        level = "MEDIUM"
+
+    return {
+        "risk_level": level,
+        "expected_increase_pct": round(pct, 2),
+        "baseline_price": round(baseline, 2),
+        "recent_price": round(recent, 2),
+        "recommendation": "Stock up before supplier price hike",
+    }
+
+
+def build_price_plot_data(price_df: pd.DataFrame):
+    return {
+        "history": [
+            {"date": d.strftime("%Y-%m-%d"), "qty": round(p, 2)}
+            for d, p in zip(price_df["ds"], price_df["y"])
+        ],
+        "cutoff_date": price_df["ds"].max().strftime("%Y-%m-%d"),
+    }
+
+
+def project_price_series(price_df: pd.DataFrame, horizon_days: int):
+    if len(price_df) < 5:
+        return [], []
+
+    last_price = price_df["y"].iloc[-1]
+
+    # simple slope from last N points
+    recent = price_df.tail(5)
+    slope = (recent["y"].iloc[-1] - recent["y"].iloc[0]) / max(len(recent), 1)
+
+    forecast = []
+    confidence = []
+
+    start_date = price_df["ds"].max()
+
+    for i in range(1, horizon_days + 1):
+        projected = max(0, last_price + slope * i)
+
+        date = start_date + timedelta(days=i)
+
+        forecast.append({
+            "date": date.date().isoformat(),
+            "qty": round(projected, 2),
+        })
+
+        confidence.append({
+            "date": date.date().isoformat(),
+            "low": round(projected * 0.95, 2),
+            "high": round(projected * 1.05, 2),
+        })
+
+    return forecast, confidence
+
+
+def forecast_medicine(
+    *,
+    medicine_name: str,
+    sales_df: pd.DataFrame,
+    price_df: pd.DataFrame,
+    current_stock: int,
+    expiry_map: dict,
+    horizon_days: list[int],
+    prophet_model: dict | None = None,
+) -> dict:
+    """
+    Fits demand and price forecasts for one medicine from its daily series
+    and inventory snapshot, and returns the ForecastResponse fields plus
+    "prophet_model", the new Prophet fit to persist (None if there is none).
+
+    Needs no database or app state, so it also runs in worker processes.
+    Raises InsufficientHistoryError when a series is too short.
+    """
+    if len(sales_df) < 14:
+        raise InsufficientHistoryError("Not enough sales data for demand forecasting")
+
+    if len(price_df) < 5:
+        raise InsufficientHistoryError("Not enough price history for price forecasting")
+
+    # Unified horizon
+    max_horizon = max(horizon_days)
+
+    # DEMAND FORECAST (model picked per series)
+    demand_forecast_df, demand_model, prophet_fit = forecast_demand_series(
+        sales_df, max_horizon, prophet_model=prophet_model
+    )
+    demand_cutoff = sales_df["ds"].max()
+
+    demand_forecast = {}
+    reorder_quantity = {}
+
+    for h in horizon_days:
+        slice_df = demand_forecast_df.tail(h)
+        expected = int(slice_df["yhat"].clip(lower=0).sum())
+
+        demand_forecast[str(h)] = expected
+        reorder_quantity[str(h)] = max(
+            0, expected + SAFETY_STOCK - current_stock
+        )
+
+    reorder_now = reorder_quantity[str(min(horizon_days))] > 0
+
+    # PRICE FORECAST (DETERMINISTIC — NOT PROPHET)
+    price_forecast, price_confidence = project_price_series(price_df, max_horizon)
+    price_cutoff = price_df["ds"].max()
+
+    # PRICE SURGE DETECTION
+    price_surge_risk = None
+
+    if price_forecast:
+        recent_price = price_df["y"].tail(5).mean()
+        future_price = mean(p["qty"] for p in price_forecast[:5])
+
+        pct_change = ((future_price - recent_price) / recent_price) * 100
+
+        if pct_change >= 15:
+            price_surge_risk = {
+                "risk_level": "HIGH",
+                "expected_increase_pct": round(pct_change, 2),
+                "recommendation": "Stock up before supplier price hike",
+                "baseline_price": round(recent_price, 2),
+                "recent_price": round(future_price, 2),
+            }
+        elif pct_change >= 7:
+            price_surge_risk = {
+                "risk_level": "MEDIUM",
+                "expected_increase_pct": round(pct_change, 2),
+                "recommendation": "Consider early procurement to protect margins",
+                "baseline_price": round(recent_price, 2),
+                "recent_price": round(future_price, 2),
+            }
+
+    # EXPIRY & WASTE ESTIMATION
+    expiry_risk = {}
+    estimated_waste_units = 0
+    demand_30d = demand_forecast.get("30", 0)
+
+    for batch_id, info in expiry_map.items():
+        if info["days_to_expiry"] <= 30:
+            expiry_risk[batch_id] = info["qty"]
+            if info["qty"] > demand_30d:
+                estimated_waste_units += info["qty"] - demand_30d
+
+    # PLOT DATA
+    demand_plot = build_plot_data(sales_df, demand_forecast_df, demand_cutoff)
+
+    price_plot = {
+        "history": [
+            {"date": d.strftime("%Y-%m-%d"), "qty": round(p, 2)}
+            for d, p in zip(price_df["ds"], price_df["y"])
+        ],
+        "forecast": price_forecast,
+        "confidence": price_confidence,
+        "cutoff_date": price_cutoff.strftime("%Y-%m-%d"),
+    }
+
+    return {
+        "medicine_name": medicine_name,
+        "current_stock": current_stock,
+
+        "demand_forecast": demand_forecast,
+        "demand_model": demand_model,
+        "reorder_quantity": reorder_quantity,
+        "reorder_now": reorder_now,
+
+        "expiry_risk": expiry_risk,
+        "estimated_waste_units": estimated_waste_units,
+
+        "plot_data": {
+            "demand": demand_plot,
+            "price": price_plot,
+        },
+
+        "price_surge_risk": price_surge_risk,
+        "price_plot_data": price_plot,
+        "prophet_model": prophet_fit,
+    }
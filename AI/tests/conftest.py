@@ -0,0 +1,15 @@
+import base64
+import os
+import sys
+from pathlib import Path
+
+# app.py reads its configuration at import time; none of the tests reach a
+# real database or the chat model
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+os.environ.setdefault("CRYPTO_KEY", base64.b64encode(os.urandom(32)).decode())
+os.environ.setdefault("BASE_URL", "http://localhost")
+os.environ.setdefault("API_KEY", "test")
+os.environ.setdefault("MODEL_NAME", "test")
+os.environ.setdefault("JWT_SECRET", "test")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
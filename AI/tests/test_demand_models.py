@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from forecasting import (
+    CROSTON_ALPHA,
+    PROPHET_MIN_DAYS,
+    croston_sba_forecast,
+    seasonal_naive_forecast,
+    select_demand_model,
+    ses_forecast,
+)
+
+WEEK = np.array([5.0, 8.0, 6.0, 7.0, 9.0, 20.0, 15.0])
+
+
+def test_long_dense_history_selects_prophet():
+    rng = np.random.default_rng(0)
+    y = rng.poisson(10, PROPHET_MIN_DAYS).astype(float) + 1
+
+    assert select_demand_model(y) == "prophet"
+
+
+def test_intermittent_history_selects_croston():
+    y = np.zeros(PROPHET_MIN_DAYS * 2)
+    y[::5] = 3
+
+    assert select_demand_model(y) == "croston_sba"
+
+
+def test_weekly_pattern_selects_seasonal_naive():
+    assert select_demand_model(np.tile(WEEK, 8)) == "seasonal_naive"
+
+
+def test_flat_or_short_history_selects_ses():
+    assert select_demand_model(np.full(60, 4.0)) == "ses"
+    assert select_demand_model(np.array([3.0, 4.0, 5.0, 4.0, 3.0])) == "ses"
+
+
+def test_croston_sba_rate_for_regular_demand():
+    y = np.tile([0.0, 4.0], 30)
+
+    yhat, sigma = croston_sba_forecast(y, 10)
+
+    assert yhat.shape == sigma.shape == (10,)
+    assert yhat == pytest.approx(np.full(10, (1 - CROSTON_ALPHA / 2) * 4 / 2))
+
+
+def test_croston_sba_without_demand_forecasts_zero():
+    yhat, sigma = croston_sba_forecast(np.zeros(30), 7)
+
+    assert not yhat.any()
+    assert not sigma.any()
+
+
+def test_ses_on_constant_series_is_flat_and_exact():
+    yhat, sigma = ses_forecast(np.full(30, 6.0), 5)
+
+    assert yhat == pytest.approx(np.full(5, 6.0))
+    assert sigma == pytest.approx(np.zeros(5))
+
+
+def test_ses_interval_widens_with_horizon():
+    rng = np.random.default_rng(1)
+    y = rng.normal(10, 2, 60)
+
+    yhat, sigma = ses_forecast(y, 14)
+
+    assert np.all(yhat == yhat[0])
+    assert np.all(np.diff(sigma) >= 0)
+
+
+def test_seasonal_naive_repeats_the_weekly_profile():
+    y = np.tile(WEEK, 4)
+
+    yhat, sigma = seasonal_naive_forecast(y, 14)
+
+    assert yhat == pytest.approx(np.tile(WEEK, 2))
+    assert sigma == pytest.approx(np.zeros(14))
+
+
+def test_seasonal_naive_averages_recent_weeks():
+    y = np.concatenate([np.tile(WEEK, 3), WEEK + 4])
+
+    yhat, _ = seasonal_naive_forecast(y, 7)
+
+    assert yhat == pytest.approx(WEEK + 1)
@@ -0,0 +1,59 @@
+import app
+
+# backend/routes/v1/no-auth/email.ts storeownerEmailSchema
+STRING_FIELDS = ("to_email", "store_name", "supplier_name", "invoice_id", "expected_delivery")
+
+
+def assert_storeowner_dispatch_schema(payload: dict):
+    assert set(payload) == {*STRING_FIELDS, "items"}
+    for field in STRING_FIELDS:
+        assert isinstance(payload[field], str)
+    for key, value in payload["items"].items():
+        assert isinstance(key, str)
+        # z.number().int().positive()
+        assert type(value) is int and value > 0, (key, value)
+
+
+def dispatch(upload_id: str, **items) -> dict:
+    return {
+        "to_email": "owner@example.com",
+        "store_name": "Main Street Pharmacy",
+        "supplier_name": "Acme Pharma",
+        "invoice_id": upload_id,
+        "items": items,
+        "expected_delivery": "Already Delivered",
+    }
+
+
+def test_merged_digest_matches_backend_schema():
+    merged = app.merge_dispatch_payloads([
+        dispatch("u1", **{"Medicines Uploaded": 5, "Errors": 1}),
+        dispatch("u2", **{"Medicines Uploaded": 3}),
+        dispatch("u3", **{"Medicines Uploaded": 0}),
+    ])
+
+    assert_storeowner_dispatch_schema(merged)
+    assert merged["items"] == {"Uploads": 3, "Medicines Uploaded": 8, "Errors": 1}
+    assert merged["invoice_id"] == (
+        "u1 (Medicines Uploaded: 5, Errors: 1); u2 (Medicines Uploaded: 3); u3 (Medicines Uploaded: 0)"
+    )
+
+
+def test_zero_totals_are_dropped():
+    merged = app.merge_dispatch_payloads([
+        dispatch("u1", **{"Medicines Uploaded": 0}),
+        dispatch("u2", **{"Medicines Uploaded": 0}),
+    ])
+
+    assert_storeowner_dispatch_schema(merged)
+    assert merged["items"] == {"Uploads": 2}
+
+
+def test_names_are_deduplicated():
+    first, second = dispatch("u1", Errors=2), dispatch("u2", Errors=1)
+    second["supplier_name"] = "Other Supplier"
+
+    merged = app.merge_dispatch_payloads([first, second])
+
+    assert merged["store_name"] == "Main Street Pharmacy"
+    assert merged["supplier_name"] == "Acme Pharma, Other Supplier"
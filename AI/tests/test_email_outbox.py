@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import app
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    app.EmailOutbox.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def add_email(session, email_id, *, status, attempts, updated_ago=0):
+    now = datetime.utcnow()
+    session.add(app.EmailOutbox(
+        id=email_id,
+        template="storeowner-dispatch",
+        payload="encrypted",
+        status=status,
+        attempts=attempts,
+        nextAttemptAt=now - timedelta(seconds=1),
+        createdAt=now,
+        updatedAt=now - timedelta(seconds=updated_ago),
+    ))
+    session.commit()
+
+
+def test_claims_due_and_stuck_emails(session):
+    stuck = app.EMAIL_OUTBOX_SENDING_TIMEOUT_SECONDS + 1
+    add_email(session, "due", status="PENDING", attempts=0)
+    add_email(session, "stuck", status="SENDING", attempts=1, updated_ago=stuck)
+    add_email(session, "sending", status="SENDING", attempts=1)
+
+    claimed = app.claim_email_outbox_batch(session)
+
+    assert sorted((c[0], c[4]) for c in claimed) == [("due", 1), ("stuck", 2)]
+    assert session.get(app.EmailOutbox, "sending").attempts == 1
+
+
+def test_stuck_email_out_of_attempts_is_dead(session):
+    stuck = app.EMAIL_OUTBOX_SENDING_TIMEOUT_SECONDS + 1
+    add_email(session, "crashing", status="SENDING", attempts=app.EMAIL_OUTBOX_MAX_ATTEMPTS, updated_ago=stuck)
+
+    assert app.claim_email_outbox_batch(session) == []
+
+    row = session.get(app.EmailOutbox, "crashing")
+    assert row.status == "DEAD"
+    assert row.attempts == app.EMAIL_OUTBOX_MAX_ATTEMPTS
+    assert row.lastError
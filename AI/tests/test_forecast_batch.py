@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app
+from forecast_cache import WatermarkCache
+from forecasting import InsufficientHistoryError
+
+
+def make_response(name: str) -> app.ForecastResponse:
+    return app.ForecastResponse(
+        medicine_name=name,
+        current_stock=10,
+        demand_forecast={"7": 3},
+        reorder_quantity={"7": 0},
+        reorder_now=False,
+        expiry_risk={"7": 0},
+        estimated_waste_units=0,
+        plot_data={},
+    )
+
+
+def fake_forecast_medicine(*, name: str, horizon_days: list[int]) -> dict:
+    if name == "short":
+        raise InsufficientHistoryError("Not enough sales data to forecast")
+    return make_response(name).model_dump()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def prepare(req):
+        cached = {"m-cached": make_response("cached")}
+        inputs = {"m-fit": {"name": "fit"}, "m-short": {"name": "short"}}
+        watermarks = {"m-fit": ("w",), "m-short": ("w",)}
+        return cached, inputs, watermarks
+
+    pool = ThreadPoolExecutor(max_workers=2)
+    monkeypatch.setattr(app, "prepare_forecast_batch", prepare)
+    monkeypatch.setattr(app, "forecast_medicine", fake_forecast_medicine)
+    monkeypatch.setattr(app, "FORECAST_POOL", pool)
+    monkeypatch.setattr(app, "FORECAST_CACHE", WatermarkCache(max_entries=16))
+    yield TestClient(app.app)
+    pool.shutdown()
+
+
+def read_lines(response) -> list[dict]:
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_cached_then_missing_then_fitted(client):
+    response = client.post("/forecast/inventory/batch", json={
+        "store_id": "store-1",
+        "medicine_ids": ["m-missing", "m-fit", "m-cached", "m-short"],
+        "horizon_days": [7],
+    })
+    lines = read_lines(response)
+
+    assert [(line["medicine_id"], line["status"]) for line in lines[:2]] == [
+        ("m-cached", "ok"),
+        ("m-missing", "error"),
+    ]
+    assert lines[0]["forecast"]["medicine_name"] == "cached"
+    assert lines[1]["detail"] == "Medicine not found"
+
+    fitted = {line["medicine_id"]: line for line in lines[2:]}
+    assert set(fitted) == {"m-fit", "m-short"}
+    assert fitted["m-fit"]["status"] == "ok"
+    assert fitted["m-fit"]["forecast"]["medicine_name"] == "fit"
+    assert fitted["m-short"]["status"] == "skipped"
+    assert "Not enough sales data" in fitted["m-short"]["detail"]
+
+
+def test_batch_caches_fitted_forecasts(client):
+    client.post("/forecast/inventory/batch", json={
+        "store_id": "store-1",
+        "medicine_ids": ["m-fit"],
+        "horizon_days": [7],
+    })
+
+    cached = app.FORECAST_CACHE.get(("store-1", "m-fit", (7,)), ("w",))
+    assert cached is not None and cached.medicine_name == "fit"
+
+
+def test_batch_rejects_empty_horizons(client):
+    response = client.post("/forecast/inventory/batch", json={"store_id": "store-1", "horizon_days": []})
+    assert response.status_code == 400
+
+
+def test_batch_keeps_in_flight_fits_bounded(monkeypatch):
+    lock = threading.Lock()
+    running = {"now": 0, "max": 0}
+
+    def counting_forecast(*, name: str, horizon_days: list[int]) -> dict:
+        with lock:
+            running["now"] += 1
+            running["max"] = max(running["max"], running["now"])
+        time.sleep(0.02)
+        with lock:
+            running["now"] -= 1
+        return make_response(name).model_dump()
+
+    inputs = {f"m-{i}": {"name": f"fit-{i}"} for i in range(8)}
+    pool = ThreadPoolExecutor(max_workers=8)
+    monkeypatch.setattr(app, "prepare_forecast_batch", lambda req: ({}, inputs, {m: ("w",) for m in inputs}))
+    monkeypatch.setattr(app, "forecast_medicine", counting_forecast)
+    monkeypatch.setattr(app, "FORECAST_POOL", pool)
+    monkeypatch.setattr(app, "FORECAST_CACHE", WatermarkCache(max_entries=16))
+    monkeypatch.setattr(app, "FORECAST_BATCH_MAX_IN_FLIGHT", 2)
+
+    response = TestClient(app.app).post("/forecast/inventory/batch", json={"store_id": "store-1", "horizon_days": [7]})
+    pool.shutdown()
+
+    lines = read_lines(response)
+    assert {line["medicine_id"] for line in lines} == set(inputs)
+    assert all(line["status"] == "ok" for line in lines)
+    assert running["max"] <= 2
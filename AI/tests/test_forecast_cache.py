@@ -0,0 +1,45 @@
+from forecast_cache import WatermarkCache
+
+
+def test_hit_only_for_the_same_watermark():
+    cache = WatermarkCache()
+    cache.put("k", ("2026-05-01", 3), "forecast")
+
+    assert cache.get("k", ("2026-05-01", 3)) == "forecast"
+    assert cache.get("k", ("2026-05-01", 4)) is None
+    assert cache.get("other", ("2026-05-01", 3)) is None
+
+
+def test_put_replaces_stale_entry():
+    cache = WatermarkCache()
+    cache.put("k", 1, "old")
+    cache.put("k", 2, "new")
+
+    assert cache.get("k", 1) is None
+    assert cache.get("k", 2) == "new"
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = WatermarkCache(max_entries=2)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    # reading "a" makes "b" the oldest
+    assert cache.get("a", 1) == "A"
+
+    cache.put("c", 1, "C")
+
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) == "A"
+    assert cache.get("c", 1) == "C"
+
+
+def test_stale_lookup_does_not_refresh_entry():
+    cache = WatermarkCache(max_entries=2)
+    cache.put("a", 1, "A")
+    cache.put("b", 1, "B")
+    assert cache.get("a", 2) is None
+
+    cache.put("c", 1, "C")
+
+    assert cache.get("a", 1) is None
+    assert cache.get("b", 1) == "B"
@@ -0,0 +1,128 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import forecast_jobs
+from forecast_jobs import ForecastJobQueue, JobQueueFullError
+
+
+@pytest.fixture
+def executor():
+    executor = ThreadPoolExecutor(max_workers=1)
+    yield executor
+    executor.shutdown(wait=True, cancel_futures=True)
+
+
+@pytest.fixture
+def jobs(executor):
+    jobs = ForecastJobQueue(executor, max_pending=2, ttl_seconds=60)
+    yield jobs
+    jobs.shutdown()
+
+
+def wait_for_status(jobs, job_id, *statuses):
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        job = jobs.get(job_id)
+        if job["status"] in statuses:
+            return job
+        time.sleep(0.01)
+    raise AssertionError(f"job {job_id} is still {jobs.get(job_id)['status']}")
+
+
+def test_result_is_post_processed_off_the_executor(jobs):
+    threads = []
+
+    def on_result(value):
+        threads.append(threading.current_thread().name)
+        return value * 2
+
+    job_id = jobs.submit(lambda x: x + 1, 20, on_result=on_result)
+    job = wait_for_status(jobs, job_id, "SUCCEEDED")
+
+    assert job["result"] == 42
+    assert job["error"] is None
+    assert job["finishedAt"] is not None
+    assert threads and threads[0].startswith("forecast-job")
+
+
+def test_failures_are_recorded(jobs):
+    def fail():
+        raise ValueError("no history")
+
+    job_id = jobs.submit(fail)
+    job = wait_for_status(jobs, job_id, "FAILED")
+    assert job["error"] == "no history"
+
+    job_id = jobs.submit(lambda: 1, on_result=lambda _: fail())
+    assert wait_for_status(jobs, job_id, "FAILED")["error"] == "no history"
+
+
+def test_full_queue_raises(jobs):
+    release = threading.Event()
+    jobs.submit(release.wait, 5)
+    jobs.submit(release.wait, 5)
+
+    with pytest.raises(JobQueueFullError):
+        jobs.submit(release.wait, 5)
+
+    release.set()
+
+
+def test_cancel_queued_job(jobs):
+    started, release = threading.Event(), threading.Event()
+    running = jobs.submit(lambda: started.set() or release.wait(5))
+    queued = jobs.submit(lambda: "never")
+
+    assert started.wait(5)
+    assert jobs.get(running)["status"] == "RUNNING"
+    assert jobs.cancel(queued)["status"] == "CANCELLED"
+    # the cancelled job no longer counts against max_pending
+    jobs.submit(lambda: "ok")
+
+    release.set()
+    assert wait_for_status(jobs, running, "SUCCEEDED")["result"] is True
+    assert jobs.get(queued)["result"] is None
+
+
+def test_cancel_running_job_discards_its_result(jobs):
+    started, release = threading.Event(), threading.Event()
+
+    def fit():
+        started.set()
+        release.wait(5)
+        return "late"
+
+    job_id = jobs.submit(fit)
+    assert started.wait(5)
+    assert jobs.cancel(job_id)["status"] == "CANCELLED"
+
+    release.set()
+    time.sleep(0.1)
+    job = jobs.get(job_id)
+    assert job["status"] == "CANCELLED"
+    assert job["result"] is None
+
+
+def test_cancel_unknown_or_finished_job(jobs):
+    assert jobs.cancel("missing") is None
+
+    job_id = jobs.complete("cached")
+    assert jobs.cancel(job_id)["status"] == "SUCCEEDED"
+
+
+def test_finished_jobs_expire_after_ttl(monkeypatch, executor):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(forecast_jobs, "time", SimpleNamespace(time=lambda: now.value))
+    jobs = ForecastJobQueue(executor, max_pending=2, ttl_seconds=60)
+
+    job_id = jobs.complete("cached")
+    now.value += 59
+    assert jobs.get(job_id)["result"] == "cached"
+
+    now.value += 2
+    assert jobs.get(job_id) is None
+    jobs.shutdown()
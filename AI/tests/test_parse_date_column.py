@@ -0,0 +1,94 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from app import parse_date_column
+
+
+def test_day_first_column_uses_detected_format():
+    series = pd.Series(["31/01/2026", "01/02/2026", "31/01/2026"], index=[5, 6, 7])
+
+    parsed = parse_date_column(series)
+
+    assert list(parsed.index) == [5, 6, 7]
+    assert parsed.tolist() == [
+        pd.Timestamp("2026-01-31"),
+        pd.Timestamp("2026-02-01"),
+        pd.Timestamp("2026-01-31"),
+    ]
+
+
+def test_ambiguous_dates_are_read_month_first():
+    series = pd.Series(["06/01/2027", "07/02/2027", "06-01-2027", "06.01.2027"])
+
+    parsed = parse_date_column(series)
+
+    assert parsed.tolist() == [
+        pd.Timestamp("2027-06-01"),
+        pd.Timestamp("2027-07-02"),
+        pd.Timestamp("2027-06-01"),
+        pd.Timestamp("2027-06-01"),
+    ]
+
+
+def test_month_first_column_uses_detected_format():
+    series = pd.Series(["01/31/2026", "06/01/2026"])
+
+    parsed = parse_date_column(series)
+
+    assert parsed.tolist() == [pd.Timestamp("2026-01-31"), pd.Timestamp("2026-06-01")]
+
+
+def test_blank_and_invalid_cells_become_nat():
+    series = pd.Series(["2026-05-01", None, "", "  ", "not a date", np.nan], dtype=object)
+
+    parsed = parse_date_column(series)
+
+    assert parsed.iloc[0] == pd.Timestamp("2026-05-01")
+    assert parsed.iloc[1:].isna().all()
+
+
+def test_all_blank_column_is_all_nat():
+    series = pd.Series([None, np.nan, None], dtype=object, index=[3, 4, 5])
+
+    parsed = parse_date_column(series)
+
+    assert pd.api.types.is_datetime64_any_dtype(parsed)
+    assert list(parsed.index) == [3, 4, 5]
+    assert parsed.isna().all()
+
+
+def test_empty_column():
+    parsed = parse_date_column(pd.Series([], dtype=object))
+
+    assert parsed.empty
+
+
+def test_offset_timestamps_become_naive_utc():
+    series = pd.Series([
+        "2026-05-01",
+        "2026-05-01T10:00:00+05:30",
+        "2026-05-01T10:00:00Z",
+        "2026-05-01T10:00:00-04:00",
+    ])
+
+    parsed = parse_date_column(series)
+
+    assert parsed.dt.tz is None
+    assert parsed.tolist() == [
+        pd.Timestamp("2026-05-01 00:00:00"),
+        pd.Timestamp("2026-05-01 04:30:00"),
+        pd.Timestamp("2026-05-01 10:00:00"),
+        pd.Timestamp("2026-05-01 14:00:00"),
+    ]
+
+
+def test_excel_dates_are_kept():
+    series = pd.Series([datetime(2026, 5, 1), None, datetime(2026, 6, 1)], dtype=object)
+
+    parsed = parse_date_column(series)
+
+    assert parsed.iloc[0] == pd.Timestamp("2026-05-01")
+    assert pd.isna(parsed.iloc[1])
+    assert parsed.iloc[2] == pd.Timestamp("2026-06-01")
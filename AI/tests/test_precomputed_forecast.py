@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import app
+
+GENERATED_AT = datetime(2026, 10, 19, 2, 0)
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    app.MedicineForecast.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def add_forecast(session, medicine_id="med-1", **fields):
+    row = {
+        "id": medicine_id,
+        "storeId": "store-1",
+        "medicineId": medicine_id,
+        "horizonDays": [7, 15, 30],
+        "generatedAt": GENERATED_AT,
+        "result": {
+            "medicine_name": "Paracetamol",
+            "current_stock": 40,
+            "demand_forecast": {"7": 20, "15": 45, "30": 90},
+            "demand_model": "ses",
+            "reorder_quantity": {"7": 0, "15": 15, "30": 60},
+            "reorder_now": True,
+            "expiry_risk": {"7": 0},
+            "estimated_waste_units": 0,
+            "plot_data": {},
+        },
+    }
+    session.add(app.MedicineForecast(**(row | fields)))
+    session.commit()
+
+
+def request(horizons, medicine_id="med-1"):
+    return app.ForecastRequest(
+        store_id="store-1", medicine_id=medicine_id, horizon_days=horizons, mode="precomputed"
+    )
+
+
+def test_trims_to_requested_horizons(session):
+    add_forecast(session)
+
+    response = app.read_precomputed_forecast(session, request([15, 30]))
+
+    assert response.demand_forecast == {"15": 45, "30": 90}
+    assert response.reorder_quantity == {"15": 15, "30": 60}
+    assert response.reorder_now is True
+    assert response.generated_at == GENERATED_AT
+
+
+def test_reorder_now_follows_shortest_requested_horizon(session):
+    add_forecast(session)
+
+    response = app.read_precomputed_forecast(session, request([7]))
+
+    assert response.demand_forecast == {"7": 20}
+    assert response.reorder_now is False
+
+
+def test_horizon_outside_precompute_is_rejected(session):
+    add_forecast(session)
+
+    for horizons in ([7, 60], []):
+        with pytest.raises(HTTPException) as exc:
+            app.read_precomputed_forecast(session, request(horizons))
+        assert exc.value.status_code == 400
+
+
+def test_missing_or_failed_forecast(session):
+    add_forecast(session, medicine_id="med-2", result=None, error="Not enough sales data")
+
+    with pytest.raises(HTTPException) as exc:
+        app.read_precomputed_forecast(session, request([7], medicine_id="med-1"))
+    assert exc.value.status_code == 404
+
+    with pytest.raises(HTTPException) as exc:
+        app.read_precomputed_forecast(session, request([7], medicine_id="med-2"))
+    assert exc.value.status_code == 400
+    assert exc.value.detail == "Not enough sales data"
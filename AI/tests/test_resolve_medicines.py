@@ -0,0 +1,70 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+import app
+
+
+@pytest.fixture
+def session():
+    engine = create_engine("sqlite://")
+    app.Medicine.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def add_medicine(session, medicine_id, sku, ndc=None):
+    now = datetime.utcnow()
+    session.add(app.Medicine(
+        id=medicine_id, storeId="store-1", sku=sku, ndc=ndc, brandName="x", createdAt=now, updatedAt=now,
+    ))
+    session.commit()
+
+
+def chunk(*rows):
+    return pd.DataFrame([{"medicine_sku": sku, "ndc": ndc, "brand_name": "New"} for sku, ndc in rows])
+
+
+def test_matches_stored_codes_trimmed_and_case_insensitively(session):
+    add_medicine(session, "legacy", " PCM-500 ", ndc="NDC-1")
+    sku_map, ndc_map = {}, {}
+
+    app.resolve_chunk_medicines(session, "store-1", chunk(("pcm-500", None), ("other", "ndc-1")), sku_map, ndc_map)
+
+    assert sku_map == {"pcm-500": "legacy"}
+    assert ndc_map == {"ndc-1": "legacy"}
+    # the stored values are left as entered
+    assert session.get(app.Medicine, "legacy").sku == " PCM-500 "
+    assert session.query(app.Medicine).count() == 1
+
+
+def test_unknown_skus_are_created_once(session):
+    add_medicine(session, "legacy", "PCM-500")
+    sku_map, ndc_map = {}, {}
+
+    app.resolve_chunk_medicines(session, "store-1", chunk(("new-1", None), ("new-1", None)), sku_map, ndc_map)
+    app.resolve_chunk_medicines(session, "store-1", chunk(("pcm-500", None), ("new-1", None)), {}, {})
+
+    assert set(sku_map) == {"new-1"}
+    assert session.query(app.Medicine).count() == 2
+
+
+def test_upsert_conflict_target_matches_the_sku_index():
+    index = next(i for i in app.Medicine.__table__.indexes if i.name == "Medicine_storeId_sku_key")
+    create = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    upsert = str(
+        postgresql.insert(app.Medicine)
+        .values(id="m", storeId="s", sku="a", brandName="x")
+        .on_conflict_do_nothing(index_elements=[app.Medicine.storeId, app.normalized_code(app.Medicine.sku)])
+        .compile(dialect=postgresql.dialect())
+    )
+
+    assert index.unique
+    assert 'ON "Medicine" ("storeId", lower(trim(sku)))' in create
+    assert 'ON CONFLICT ("storeId", lower(trim(sku))) DO NOTHING' in upsert
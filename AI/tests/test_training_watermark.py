@@ -0,0 +1,34 @@
+import pandas as pd
+
+from forecasting import training_watermark
+
+
+def sales(days, quantities):
+    return pd.DataFrame({"ds": pd.to_datetime(days), "y": quantities})
+
+
+def test_equal_series_share_a_watermark():
+    a = sales(["2026-05-01", "2026-05-02"], [3, 4])
+    b = sales(["2026-05-01", "2026-05-02"], [3.0, 4.0])
+
+    assert training_watermark(a) == training_watermark(b)
+
+
+def test_any_change_gives_a_new_watermark():
+    base = sales(["2026-05-01", "2026-05-02"], [3, 4])
+    changed = [
+        sales(["2026-05-01", "2026-05-02"], [3, 5]),
+        sales(["2026-05-01", "2026-05-03"], [3, 4]),
+        sales(["2026-05-01", "2026-05-02", "2026-05-03"], [3, 4, 0]),
+    ]
+
+    watermarks = {training_watermark(df) for df in [base, *changed]}
+
+    assert len(watermarks) == 4
+
+
+def test_watermark_ignores_extra_columns_and_index():
+    a = sales(["2026-05-01", "2026-05-02"], [3, 4])
+    b = a.assign(price=[1.5, 2.5]).set_axis([10, 11])
+
+    assert training_watermark(a) == training_watermark(b)
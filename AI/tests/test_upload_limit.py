@@ -0,0 +1,62 @@
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from upload_limit import UploadSizeLimitMiddleware
+
+LIMIT = 4096
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(file: UploadFile = File(...)):
+        return {"size": len(await file.read())}
+
+    @app.post("/json")
+    async def echo(body: dict):
+        return {"keys": len(body)}
+
+    app.add_middleware(UploadSizeLimitMiddleware, max_bytes=LIMIT)
+    return TestClient(app)
+
+
+def multipart_chunks(size: int):
+    yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.csv"\r\n\r\n'
+    for _ in range(size // 1024):
+        yield b"x" * 1024
+    yield b"\r\n--b--\r\n"
+
+
+def test_small_upload_passes(client):
+    response = client.post("/upload", files={"file": ("a.csv", b"x" * 100)})
+
+    assert response.status_code == 200
+    assert response.json() == {"size": 100}
+
+
+def test_large_content_length_is_rejected(client):
+    response = client.post("/upload", files={"file": ("a.csv", b"x" * (LIMIT * 2))})
+
+    assert response.status_code == 413
+
+
+def test_large_streamed_body_is_rejected(client):
+    # chunked: no Content-Length, the limit applies while the body arrives
+    response = client.post(
+        "/upload",
+        content=multipart_chunks(LIMIT * 2),
+        headers={"content-type": "multipart/form-data; boundary=b"},
+    )
+
+    assert response.status_code == 413
+
+
+def test_other_bodies_are_not_limited(client):
+    body = {f"k{i}": "x" * 100 for i in range(100)}
+
+    response = client.post("/json", json=body)
+
+    assert response.status_code == 200
@@ -0,0 +1,29 @@
+import threading
+
+import app
+
+
+def test_store_lock_without_advisory_locks_is_acquired():
+    assert app.engine.dialect.name == "sqlite"
+
+    with app.store_upload_lock("store-1") as acquired:
+        assert acquired is True
+
+    with app.forecast_precompute_lock() as acquired:
+        assert acquired is True
+
+
+def test_scheduled_upload_runs_on_sqlite(monkeypatch):
+    done = threading.Event()
+    calls = []
+
+    def process(*args):
+        calls.append(args)
+        done.set()
+
+    monkeypatch.setattr(app, "process_supplier_medicine_upload", process)
+
+    app.schedule_upload("upload-1", "store-1", None, "/tmp/upload-1.csv")
+
+    assert done.wait(5)
+    assert calls == [("upload-1", "store-1", None, "/tmp/upload-1.csv")]
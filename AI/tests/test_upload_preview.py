@@ -0,0 +1,72 @@
+import asyncio
+import io
+
+import pandas as pd
+import pytest
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app
+
+CSV = (
+    "medicine_sku,ndc,brand_name,generic_name,dosage_form,strength,uom,category,batch_number,"
+    "qty_received,expiry_date,purchase_price,mrp,received_at,location,notes\n"
+    "PCM-500,NDC-1,Calpol,Paracetamol,Tablet,500mg,strip,Analgesic,B1,10,2099-01-31,1.5,2.0,2026-01-02,A1,\n"
+    "IBU-200,,Brufen,Ibuprofen,Tablet,200mg,strip,Analgesic,B2,0,2099-01-31,1.0,1.5,2026-01-02,A2,\n"
+)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    for model in (app.Medicine, app.Upload):
+        model.__table__.create(engine)
+    monkeypatch.setattr(app, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(app, "UPLOAD_STORE", tmp_path)
+    monkeypatch.setattr(app, "get_store_id_by_slug", lambda slug: "store-1")
+    yield tmp_path
+    engine.dispose()
+
+
+def preview(content: bytes):
+    file = UploadFile(io.BytesIO(content), filename="supplier.csv")
+    return asyncio.run(app.supplier_upload(store_slug="s", supplier_id=None, mode="preview", file=file))
+
+
+def stored_upload(upload_id):
+    with app.SessionLocal() as session:
+        return session.get(app.Upload, upload_id)
+
+
+def test_preview_caches_parsed_frame_as_parquet(store):
+    response = preview(CSV.encode())
+
+    upload = stored_upload(response.upload_id)
+    parsed_path = upload.metadata_json["parsedPath"]
+    assert upload.status == "PREVIEW_READY"
+    assert parsed_path.startswith(str(store)) and parsed_path.endswith(".parquet")
+
+    parsed = pd.read_parquet(parsed_path)
+    assert parsed["medicine_sku"].tolist() == ["pcm-500"]
+    assert parsed.index.tolist() == [0]
+    assert response.preview["summary"]["rejectedRows"] == 1
+
+
+def test_unexpected_preview_error_marks_upload_failed(store, monkeypatch):
+    def broken_preview(upload_id, store_id, file_path):
+        raise RuntimeError("catalog unavailable")
+
+    monkeypatch.setattr(app, "preview_supplier_upload", broken_preview)
+
+    with pytest.raises(HTTPException) as excinfo:
+        preview(CSV.encode())
+
+    assert excinfo.value.status_code == 500
+    with app.SessionLocal() as session:
+        (upload,) = session.query(app.Upload).all()
+    assert upload.status == "FAILED"
+    assert upload.metadata_json["messages"] == ["catalog unavailable"]
+    # neither the source file nor anything derived from it is left behind
+    assert list(store.iterdir()) == []
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import upload_progress
+from upload_progress import UploadProgressChannel
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=100.0)
+    monkeypatch.setattr(upload_progress, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+def test_publish_coalesces_within_interval(clock):
+    channel = UploadProgressChannel(min_interval=1.0)
+
+    channel.publish("u1", {"phase": "PROCESSING", "processedRows": 1})
+    clock.value += 0.5
+    channel.publish("u1", {"phase": "PROCESSING", "processedRows": 2})
+    assert channel.get("u1")["processedRows"] == 1
+
+    clock.value += 0.6
+    channel.publish("u1", {"phase": "PROCESSING", "processedRows": 3})
+    assert channel.get("u1")["processedRows"] == 3
+
+
+def test_phase_change_and_force_bypass_interval(clock):
+    channel = UploadProgressChannel(min_interval=10.0)
+
+    assert channel.publish("u1", {"phase": "PROCESSING", "processedRows": 1}) is False
+    assert channel.publish("u1", {"phase": "COMPLETED", "processedRows": 5}) is True
+    assert channel.get("u1") == {"phase": "COMPLETED", "processedRows": 5}
+
+    assert channel.publish("u1", {"phase": "COMPLETED", "errorRows": 2}, force=True) is False
+    assert channel.get("u1") == {"phase": "COMPLETED", "processedRows": 5, "errorRows": 2}
+
+
+def test_get_returns_a_copy(clock):
+    channel = UploadProgressChannel()
+    channel.publish("u1", {"phase": "PROCESSING"})
+
+    channel.get("u1")["phase"] = "changed"
+
+    assert channel.get("u1")["phase"] == "PROCESSING"
+    assert channel.get("unknown") is None
+
+
+def test_discard_forgets_upload(clock):
+    channel = UploadProgressChannel()
+    channel.publish("u1", {"phase": "FAILED"})
+
+    channel.discard("u1")
+
+    assert channel.get("u1") is None
+    # the next publish is not held back by the discarded one
+    channel.publish("u1", {"phase": "FAILED", "processedRows": 1})
+    assert channel.get("u1")["processedRows"] == 1
+
+
+def test_finished_uploads_expire_after_retention(clock):
+    channel = UploadProgressChannel(retention=60.0)
+    channel.publish("done", {"phase": "COMPLETED"})
+    channel.publish("running", {"phase": "PROCESSING"})
+
+    clock.value += 61
+    channel.publish("other", {"phase": "PROCESSING"})
+
+    assert channel.get("done") is None
+    assert channel.get("running") is not None
+
+
+def test_subscribers_receive_snapshots_from_worker_threads():
+    channel = UploadProgressChannel(min_interval=0)
+
+    async def consume():
+        queue = channel.subscribe("u1")
+        worker = threading.Thread(
+            target=channel.publish, args=("u1", {"phase": "PROCESSING", "processedRows": 7})
+        )
+        worker.start()
+        snapshot = await asyncio.wait_for(queue.get(), timeout=5)
+        worker.join()
+
+        channel.unsubscribe("u1", queue)
+        channel.publish("u1", {"phase": "COMPLETED"})
+        await asyncio.sleep(0)
+        return snapshot, queue.qsize()
+
+    snapshot, left = asyncio.run(consume())
+
+    assert snapshot == {"phase": "PROCESSING", "processedRows": 7}
+    assert left == 0
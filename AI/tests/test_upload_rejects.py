@@ -0,0 +1,69 @@
+import csv
+
+import pandas as pd
+
+from upload_rejects import RejectedRowsReport
+
+COLUMNS = ["medicine_sku", "qty_received"]
+
+
+def read_rows(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_frame_and_rows_are_written_with_header(tmp_path):
+    path = tmp_path / "rejected.csv"
+    frame = pd.DataFrame(
+        {"medicine_sku": ["a"], "qty_received": [None], "reason": ["missing quantity"]},
+        index=[4],
+    )
+
+    with RejectedRowsReport(path, COLUMNS, truncate=True) as report:
+        report.write_frame(frame)
+        report.write_row(9, pd.Series({"medicine_sku": "b", "qty_received": 2}), "insert failed")
+        assert report.written == 2
+
+    assert read_rows(path) == [
+        ["row", "medicine_sku", "qty_received", "reason"],
+        ["4", "a", "", "missing quantity"],
+        ["9", "b", "2", "insert failed"],
+    ]
+
+
+def test_reopening_appends_without_second_header(tmp_path):
+    path = tmp_path / "rejected.csv"
+    with RejectedRowsReport(path, COLUMNS, truncate=True) as report:
+        report.write_row(1, pd.Series({"medicine_sku": "a"}), "bad")
+
+    with RejectedRowsReport(path, COLUMNS) as report:
+        report.write_row(2, pd.Series({"medicine_sku": "b"}), "bad")
+        assert report.written == 1
+
+    assert [row[0] for row in read_rows(path)] == ["row", "1", "2"]
+
+
+def test_resume_drops_lines_after_the_checkpoint(tmp_path):
+    path = tmp_path / "rejected.csv"
+    with RejectedRowsReport(path, COLUMNS, truncate=True) as report:
+        report.write_row(1, pd.Series({"medicine_sku": "a"}), "bad")
+        checkpoint = report.flush()
+        # written by the chunk that crashed before committing
+        report.write_row(7, pd.Series({"medicine_sku": "b"}), "bad")
+
+    with RejectedRowsReport(path, COLUMNS, resume_at=checkpoint) as report:
+        report.write_row(7, pd.Series({"medicine_sku": "b"}), "bad")
+
+    assert [row[0] for row in read_rows(path)] == ["row", "1", "7"]
+
+
+def test_truncate_ignores_resume_point(tmp_path):
+    path = tmp_path / "rejected.csv"
+    with RejectedRowsReport(path, COLUMNS, truncate=True) as report:
+        report.write_row(1, pd.Series({"medicine_sku": "a"}), "bad")
+        checkpoint = report.flush()
+
+    with RejectedRowsReport(path, COLUMNS, truncate=True, resume_at=checkpoint):
+        pass
+
+    assert read_rows(path) == [["row", "medicine_sku", "qty_received", "reason"]]
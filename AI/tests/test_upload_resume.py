@@ -0,0 +1,85 @@
+import csv
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import app
+
+HEADER = (
+    "medicine_sku,ndc,brand_name,generic_name,dosage_form,strength,uom,category,batch_number,"
+    "qty_received,expiry_date,purchase_price,mrp,received_at,location,notes\n"
+)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+
+    # pysqlite needs explicit BEGIN for SAVEPOINT to behave
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, _record):
+        dbapi_connection.isolation_level = None
+
+    @event.listens_for(engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    app.Base.metadata.create_all(engine)
+    monkeypatch.setattr(app, "engine", engine)
+    monkeypatch.setattr(app, "SessionLocal", sessionmaker(bind=engine))
+    monkeypatch.setattr(app, "enqueue_upload_notifications", lambda *args, **kwargs: None)
+    yield engine
+    engine.dispose()
+
+
+def supplier_row(sku, expiry):
+    return f"{sku},,Brand,Generic,Tablet,500mg,strip,Analgesic,B-{sku},5,{expiry:%Y-%m-%d},1.0,2.0,,A1,\n"
+
+
+def test_resume_reports_pending_rows_expired_since_the_interrupted_run(database, tmp_path):
+    yesterday = datetime.utcnow() - timedelta(days=1)
+    later = datetime(2099, 1, 31)
+    file_path = tmp_path / "supplier.csv"
+    # rows 0-1 were committed before the crash; rows 1 and 2 expired since
+    file_path.write_text(HEADER + "".join(
+        supplier_row(sku, expiry)
+        for sku, expiry in (("a", later), ("b", yesterday), ("c", yesterday), ("d", later))
+    ))
+
+    rejected_path = tmp_path / "supplier.rejected.csv"
+    with app.RejectedRowsReport(rejected_path, app.EXPECTED_COLUMNS, truncate=True) as report:
+        rejected_bytes = report.flush()
+
+    session = app.SessionLocal()
+    session.add(app.Store(id="store-1", name="x", slug="store-1"))
+    session.add(app.Upload(id="upload-1", storeId="store-1", status="FAILED", metadata_json={
+        "filePath": str(file_path),
+        "rejectedPath": str(rejected_path),
+        "rejectedRows": 0,
+        "rejectedBytes": rejected_bytes,
+        "lastCommittedRow": 1,
+        "processedRows": 2,
+        "insertedRows": 2,
+        "errorRows": 0,
+        "expiryCheckedAt": (yesterday - timedelta(days=1)).isoformat(),
+    }))
+    session.commit()
+    session.close()
+
+    app.process_supplier_medicine_upload("upload-1", "store-1", None, str(file_path))
+
+    with app.SessionLocal() as session:
+        upload = session.get(app.Upload, "upload-1")
+        skus = {sku for (sku,) in session.query(app.Medicine.sku)}
+    with open(rejected_path, newline="") as f:
+        reported = [(line["row"], line["reason"]) for line in csv.DictReader(f)]
+
+    assert upload.status == "APPLIED"
+    assert reported == [("2", "Medicine already expired")]
+    assert upload.metadata_json["rejectedRows"] == 1
+    assert upload.metadata_json["insertedRows"] == 3
+    assert skus == {"d"}
+    # a later resume counts row 2 as reported
+    assert datetime.fromisoformat(upload.metadata_json["expiryCheckedAt"]) > yesterday
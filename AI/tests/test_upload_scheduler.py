@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+
+from upload_scheduler import KeyedJobScheduler
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = KeyedJobScheduler(max_workers=4, thread_name_prefix="test")
+    yield scheduler
+    scheduler.shutdown(wait=True)
+
+
+def test_same_key_runs_in_submission_order(scheduler):
+    release = threading.Event()
+    done = threading.Event()
+    order = []
+
+    scheduler.submit("store-1", lambda: (release.wait(5), order.append(1)))
+    assert scheduler.submit("store-1", order.append, 2) is True
+    assert scheduler.submit("store-1", lambda: (order.append(3), done.set())) is True
+    assert scheduler.queued("store-1") == 2
+
+    release.set()
+    assert done.wait(5)
+    assert order == [1, 2, 3]
+    assert scheduler.queued("store-1") == 0
+
+
+def test_different_keys_run_in_parallel(scheduler):
+    barrier = threading.Barrier(2, timeout=5)
+    finished = []
+
+    def job(key):
+        barrier.wait()
+        finished.append(key)
+
+    assert scheduler.submit("store-1", job, "store-1") is False
+    assert scheduler.submit("store-2", job, "store-2") is False
+
+    scheduler.shutdown(wait=True)
+    assert sorted(finished) == ["store-1", "store-2"]
+
+
+def test_failing_job_does_not_block_its_key(scheduler):
+    done = threading.Event()
+
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler.submit("store-1", fail)
+    scheduler.submit("store-1", done.set)
+
+    assert done.wait(5)
+
+
+def test_key_is_free_again_after_its_jobs_finish(scheduler):
+    first = threading.Event()
+    scheduler.submit("store-1", first.set)
+    assert first.wait(5)
+
+    # _run releases the key right after the job returns
+    for _ in range(100):
+        if scheduler.queued("store-1") == 0 and "store-1" not in scheduler._waiting:
+            break
+        threading.Event().wait(0.01)
+
+    second = threading.Event()
+    assert scheduler.submit("store-1", second.set) is False
+    assert second.wait(5)
@@ -0,0 +1,47 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware capping the size of multipart request bodies.
+
+    Starlette parses (and spools) the whole multipart body before a route
+    sees its UploadFile, so a limit checked in the route only applies once
+    the full body has arrived. This rejects a body while it is received:
+    up front when Content-Length is too large, otherwise as soon as the
+    bytes read exceed `max_bytes`.
+    """
+
+    def __init__(self, app, *, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            return await self.app(scope, receive, send)
+
+        detail = f"Request body exceeds the {self.max_bytes // (1024 * 1024)} MB upload limit"
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # raised while the route parses the form; rendered as a 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
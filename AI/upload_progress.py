@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+
+TERMINAL_PHASES = {"COMPLETED", "FAILED"}
+
+
+class UploadProgressChannel:
+    """
+    In-process store of live upload progress.
+
+    Upload jobs publish snapshots here as they go; the status endpoint reads
+    them without touching the database. Publishing is coalesced per upload
+    to at most one snapshot every `min_interval` seconds, except when the
+    phase changes. Finished uploads are forgotten after `retention` seconds.
+
+    Event-loop consumers can subscribe to an upload and receive every
+    published snapshot on an asyncio.Queue, even when the job publishes
+    from a worker thread.
+    """
+
+    def __init__(self, min_interval: float = 1.0, retention: float = 900.0):
+        self._min_interval = min_interval
+        self._retention = retention
+        self._lock = threading.Lock()
+        self._latest: dict[str, dict] = {}
+        self._published_at: dict[str, float] = {}
+        self._subscribers: dict[str, list[tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def publish(self, upload_id: str, snapshot: dict, *, force: bool = False) -> bool:
+        """
+        Merges `snapshot` into the upload's live progress.
+        Returns True when the phase changed, i.e. when the caller should
+        persist the new state.
+        """
+        now = time.monotonic()
+        with self._lock:
+            previous = self._latest.get(upload_id)
+            phase_changed = previous is not None and previous.get("phase") != snapshot.get("phase")
+            last = self._published_at.get(upload_id)
+
+            if (
+                previous is not None
+                and not force
+                and not phase_changed
+                and now - last < self._min_interval
+            ):
+                return False
+
+            merged = {**(previous or {}), **snapshot}
+            self._latest[upload_id] = merged
+            self._published_at[upload_id] = now
+            self._prune(now)
+            subscribers = list(self._subscribers.get(upload_id, ()))
+
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, dict(merged))
+            except RuntimeError:
+                # subscriber's loop is closed
+                pass
+
+        return phase_changed
+
+    def get(self, upload_id: str) -> dict | None:
+        with self._lock:
+            snapshot = self._latest.get(upload_id)
+            return dict(snapshot) if snapshot else None
+
+    def subscribe(self, upload_id: str) -> asyncio.Queue:
+        """Must be called from the event loop that will consume the queue."""
+        queue: asyncio.Queue = asyncio.Queue()
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(upload_id, []).append(entry)
+        return queue
+
+    def unsubscribe(self, upload_id: str, queue: asyncio.Queue):
+        with self._lock:
+            entries = self._subscribers.get(upload_id, [])
+            entries[:] = [e for e in entries if e[1] is not queue]
+            if not entries:
+                self._subscribers.pop(upload_id, None)
+
+    def discard(self, upload_id: str):
+        with self._lock:
+            self._latest.pop(upload_id, None)
+            self._published_at.pop(upload_id, None)
+
+    def _prune(self, now: float):
+        expired = [
+            upload_id
+            for upload_id, snapshot in self._latest.items()
+            if snapshot.get("phase") in TERMINAL_PHASES
+            and now - self._published_at[upload_id] > self._retention
+        ]
+        for upload_id in expired:
+            del self._latest[upload_id]
+            del self._published_at[upload_id]
@@ -0,0 +1,64 @@
+import csv
+import os
+
+import pandas as pd
+
+
+class RejectedRowsReport:
+    """
+    Append-only CSV of the rows an upload did not ingest.
+
+    Each line holds the row's offset in the uploaded file, its content and
+    the rejection reason. Rows are written as they are rejected, so the
+    report never has to fit in memory or in the Upload metadata. The
+    header uses the upload column keys, so a corrected report can be
+    uploaded again as is.
+
+    A job re-running a chunk after a crash passes `resume_at`, the report
+    size recorded with its last checkpoint (see `flush`): lines written
+    past it belong to the uncommitted chunk and are dropped, so they are
+    not reported twice.
+    """
+
+    def __init__(self, path: str, columns: list[str], *, truncate: bool = False, resume_at: int | None = None):
+        self.path = str(path)
+        self.columns = list(columns)
+        # rows written through this instance; earlier runs are not counted
+        self.written = 0
+
+        if not truncate and resume_at is not None and os.path.exists(self.path):
+            if os.path.getsize(self.path) > resume_at:
+                os.truncate(self.path, resume_at)
+
+        needs_header = truncate or not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "w" if truncate else "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        if needs_header:
+            self._writer.writerow(["row", *self.columns, "reason"])
+
+    def write_frame(self, rejected: pd.DataFrame):
+        """Writes a frame indexed by file offset with the upload columns and a "reason" column."""
+        if rejected.empty:
+            return
+        rejected[[*self.columns, "reason"]].to_csv(self._file, header=False, index=True)
+        self.written += len(rejected)
+
+    def write_row(self, offset: int, row: pd.Series, reason: str):
+        values = [row.get(c) for c in self.columns]
+        self._writer.writerow([offset, *("" if pd.isna(v) else v for v in values), reason])
+        self.written += 1
+
+    def flush(self) -> int:
+        """Writes buffered lines to disk and returns the report size in bytes."""
+        self._file.flush()
+        return os.fstat(self._file.fileno()).st_size
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
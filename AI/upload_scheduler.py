@@ -0,0 +1,65 @@
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from logging_setup import setup_app_logger
+
+logger = setup_app_logger("upload_scheduler")
+
+
+class KeyedJobScheduler:
+    """
+    Runs jobs on a bounded thread pool, one job at a time per key.
+
+    Jobs sharing a key (a store id for uploads) run in submission order,
+    each after the previous one finished. Jobs with different keys run in
+    parallel, up to `max_workers` at once.
+    """
+
+    def __init__(self, max_workers: int, thread_name_prefix: str = "job"):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix=thread_name_prefix,
+        )
+        self._lock = threading.Lock()
+        # key -> jobs waiting behind the running one; a key is present while a job for it runs
+        self._waiting: dict[str, deque] = {}
+
+    def submit(self, key: str, fn, *args, **kwargs) -> bool:
+        """
+        Schedules fn(*args, **kwargs) for `key`.
+        Returns True if it had to queue behind a running job for the key.
+        """
+        with self._lock:
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                waiting.append((fn, args, kwargs))
+                return True
+            self._waiting[key] = deque()
+
+        self._executor.submit(self._run, key, fn, args, kwargs)
+        return False
+
+    def queued(self, key: str) -> int:
+        with self._lock:
+            return len(self._waiting.get(key, ()))
+
+    def shutdown(self, wait: bool = False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+    def _run(self, key: str, fn, args, kwargs):
+        try:
+            fn(*args, **kwargs)
+        except Exception:
+            logger.exception(f"Job for key={key} failed")
+        finally:
+            with self._lock:
+                waiting = self._waiting[key]
+                if waiting:
+                    next_job = waiting.popleft()
+                else:
+                    del self._waiting[key]
+                    next_job = None
+
+            if next_job:
+                self._executor.submit(self._run, key, *next_job)
@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "Upload" ADD COLUMN     "contentHash" TEXT;
+
+-- CreateIndex
+CREATE INDEX "Upload_storeId_contentHash_idx" ON "Upload"("storeId", "contentHash");
@@ -0,0 +1,29 @@
+-- SKUs and NDCs are matched trimmed and case-insensitively; stored values
+-- are left as they are (the UI shows them). Two medicines of a store whose
+-- SKUs only differ in case or surrounding spaces cannot both be kept under
+-- the unique index, and merging them moves inventory, movements and sales,
+-- so the migration stops and lists them instead of merging silently.
+DO $$
+DECLARE
+    duplicates TEXT;
+BEGIN
+    SELECT string_agg(format('store %s: %s', "storeId", skus), E'\n')
+    INTO duplicates
+    FROM (
+        SELECT "storeId", string_agg(quote_literal("sku") || ' (' || "id" || ')', ', ') AS skus
+        FROM "Medicine"
+        WHERE "sku" IS NOT NULL
+        GROUP BY "storeId", lower(btrim("sku"))
+        HAVING count(*) > 1
+    ) d;
+
+    IF duplicates IS NOT NULL THEN
+        RAISE EXCEPTION E'Medicines share a SKU within a store; merge or rename them, then deploy again:\n%', duplicates;
+    END IF;
+END $$;
+
+-- CreateIndex
+CREATE UNIQUE INDEX "Medicine_storeId_sku_key" ON "Medicine"("storeId", lower(btrim("sku")));
+
+-- CreateIndex
+CREATE INDEX "Medicine_storeId_ndc_normalized_idx" ON "Medicine"("storeId", lower(btrim("ndc")));
@@ -0,0 +1,5 @@
+-- AlterTable
+ALTER TABLE "EmailOutbox" ADD COLUMN     "recipientHash" TEXT;
+
+-- CreateIndex
+CREATE INDEX "EmailOutbox_recipientHash_status_idx" ON "EmailOutbox"("recipientHash", "status");
@@ -0,0 +1,26 @@
+-- CreateTable
+CREATE TABLE "MedicineForecast" (
+    "id" TEXT NOT NULL,
+    "storeId" TEXT NOT NULL,
+    "medicineId" TEXT NOT NULL,
+    "horizonDays" JSONB NOT NULL,
+    "demandModel" TEXT,
+    "reorderNow" BOOLEAN NOT NULL DEFAULT false,
+    "result" JSONB,
+    "error" TEXT,
+    "generatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "MedicineForecast_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE INDEX "MedicineForecast_storeId_reorderNow_idx" ON "MedicineForecast"("storeId", "reorderNow");
+
+-- CreateIndex
+CREATE UNIQUE INDEX "MedicineForecast_storeId_medicineId_key" ON "MedicineForecast"("storeId", "medicineId");
+
+-- AddForeignKey
+ALTER TABLE "MedicineForecast" ADD CONSTRAINT "MedicineForecast_storeId_fkey" FOREIGN KEY ("storeId") REFERENCES "Store"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "MedicineForecast" ADD CONSTRAINT "MedicineForecast_medicineId_fkey" FOREIGN KEY ("medicineId") REFERENCES "Medicine"("id") ON DELETE CASCADE ON UPDATE CASCADE;
@@ -0,0 +1,21 @@
+-- CreateTable
+CREATE TABLE "ForecastModel" (
+    "id" TEXT NOT NULL,
+    "storeId" TEXT NOT NULL,
+    "medicineId" TEXT NOT NULL,
+    "trainingWatermark" TEXT NOT NULL,
+    "modelJson" TEXT NOT NULL,
+    "createdAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "updatedAt" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "ForecastModel_pkey" PRIMARY KEY ("id")
+);
+
+-- CreateIndex
+CREATE UNIQUE INDEX "ForecastModel_storeId_medicineId_key" ON "ForecastModel"("storeId", "medicineId");
+
+-- AddForeignKey
+ALTER TABLE "ForecastModel" ADD CONSTRAINT "ForecastModel_storeId_fkey" FOREIGN KEY ("storeId") REFERENCES "Store"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "ForecastModel" ADD CONSTRAINT "ForecastModel_medicineId_fkey" FOREIGN KEY ("medicineId") REFERENCES "Medicine"("id") ON DELETE CASCADE ON UPDATE CASCADE;
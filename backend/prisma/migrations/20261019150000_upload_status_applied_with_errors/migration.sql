@@ -0,0 +1,2 @@
+-- AlterEnum
+ALTER TYPE "UploadStatus" ADD VALUE 'APPLIED_WITH_ERRORS';